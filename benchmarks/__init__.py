@@ -0,0 +1,54 @@
+"""
+    benchmarks
+    ~~~~~~~~~~
+
+    Micro-benchmarks for Yoshimi's hot paths. Run them from the project root
+    as modules, e.g::
+
+        python -m benchmarks.query_construction
+
+    The database defaults to an in-memory SQLite database. Pass ``--dsn`` to
+    run against another database.
+
+    :copyright: (c) 2013 by Ole Morten Halvorsen
+    :license: BSD, see LICENSE for more details.
+"""
+import argparse
+import timeit
+from yoshimi import db
+from yoshimi.entities import Base
+
+
+def argument_parser(description, number=1000):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        '--dsn', default='sqlite://', help='Database to run against'
+    )
+    parser.add_argument(
+        '-n', '--number', type=int, default=number,
+        help='Number of calls to time for each case'
+    )
+    return parser
+
+
+def setup_database(dsn):
+    """Creates a fresh schema in `dsn` and returns a session"""
+    db.setup_db({'sqlalchemy.url': dsn}, extension=None)
+    Base.metadata.drop_all()
+    Base.metadata.create_all()
+    return db.Session()
+
+
+def report(cases, number):
+    """Times each `(name, callable)` in `cases` and prints the cost per call
+
+    :param list cases: List of (name, callable) tuples
+    :param int number: Number of calls to time for each case
+    """
+    width = max(len(name) for name, _ in cases)
+    for name, func in cases:
+        func()  # Warm up caches
+        seconds = timeit.timeit(func, number=number)
+        print('%s  %8.1f us/call' % (
+            name.ljust(width), seconds / number * 1000000
+        ))
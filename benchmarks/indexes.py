@@ -0,0 +1,155 @@
+"""
+    benchmarks.indexes
+    ~~~~~~~~~~~~~~~~~~
+
+    Shows the query plans and timings of the tree lookups with and without
+    the indexes on `content` and `path`.
+
+    A balanced tree is generated until the path table has ``--rows`` rows
+    (1 million by default). Run it on SQLite with::
+
+        python -m benchmarks.indexes
+"""
+from sqlalchemy import (
+    and_,
+    func,
+    select,
+)
+from yoshimi.content import (
+    Content,
+    Path,
+)
+from benchmarks import (
+    argument_parser,
+    report,
+    setup_database,
+)
+
+FANOUT = 10
+TYPES = ('folder', 'article', 'image')
+
+
+def populate(connection, rows):
+    """Inserts a tree with `FANOUT` children per node until the path table
+    has at least `rows` rows. Returns the ids of the content at each level.
+    """
+    content, path = Content.__table__, Path.__table__
+    levels = [[1]]
+    lineages = {1: (1,)}
+    contents = [_content_row(1, 'folder')]
+    paths = [{'ancestor': 1, 'descendant': 1, 'length': 0}]
+    next_id = 2
+    while len(paths) < rows:
+        level = []
+        for parent in levels[-1]:
+            for i in range(FANOUT):
+                id, next_id = next_id, next_id + 1
+                lineage = lineages[parent] + (id,)
+                lineages[id] = lineage
+                level.append(id)
+                contents.append(_content_row(id, TYPES[id % len(TYPES)]))
+                paths.extend(
+                    {'ancestor': a, 'descendant': id, 'length': n}
+                    for n, a in enumerate(reversed(lineage))
+                )
+                if len(paths) >= rows:
+                    break
+            if len(paths) >= rows:
+                break
+        levels.append(level)
+
+    connection.execute(content.insert(), contents)
+    connection.execute(path.insert(), paths)
+    return levels
+
+
+def _content_row(id, type):
+    return {
+        'id': id, 'type': type, 'name': 'Content %s' % id,
+        'slug': 'content-%s' % id, 'status_id': 0, 'child_count': 0,
+    }
+
+
+def queries(levels):
+    content, path = Content.__table__, Path.__table__
+    section = levels[1][0]
+    leaf = levels[-1][0]
+    return [
+        ('parent of content', select([path.c.ancestor]).where(and_(
+            path.c.descendant == leaf, path.c.length == 1
+        ))),
+        ('lineage of content', select([path.c.ancestor]).where(
+            path.c.descendant == leaf
+        ).order_by(path.c.length.desc())),
+        ('children of section', select([path.c.descendant]).where(and_(
+            path.c.ancestor == section, path.c.length.between(1, 1)
+        ))),
+        ('folders below section', select([content.c.id]).select_from(
+            content.join(path, path.c.descendant == content.c.id)
+        ).where(and_(
+            path.c.ancestor == section,
+            path.c.length.between(1, 2),
+            content.c.type == 'folder',
+            content.c.status_id == 0,
+        ))),
+        ('count available articles', select([func.count()]).where(and_(
+            content.c.status_id == 0, content.c.type == 'article'
+        ))),
+    ]
+
+
+def explain(connection, statement):
+    if connection.dialect.name != 'sqlite':
+        return ''
+    compiled = statement.compile(
+        dialect=connection.dialect, compile_kwargs={'literal_binds': True}
+    )
+    return '; '.join(
+        row[-1] for row in connection.execute(
+            'EXPLAIN QUERY PLAN %s' % compiled
+        )
+    )
+
+
+def run(connection, cases, number):
+    for name, statement in cases:
+        print('  %s: %s' % (name, explain(connection, statement)))
+    report([
+        (name, lambda s=statement: connection.execute(s).fetchall())
+        for name, statement in cases
+    ], number)
+
+
+def main():
+    parser = argument_parser(__doc__, number=20)
+    parser.add_argument(
+        '--rows', type=int, default=1000000,
+        help='Number of rows in the path table'
+    )
+    args = parser.parse_args()
+    session = setup_database(args.dsn)
+    connection = session.connection()
+    indexes = [
+        index for table in (Content.__table__, Path.__table__)
+        for index in table.indexes
+    ]
+    for index in indexes:
+        index.drop(connection)
+
+    levels = populate(connection, args.rows)
+    cases = queries(levels)
+
+    print('Without indexes')
+    run(connection, cases, args.number)
+
+    for index in indexes:
+        index.create(connection)
+    if connection.dialect.name == 'sqlite':
+        connection.execute('ANALYZE')
+
+    print('\nWith indexes')
+    run(connection, cases, args.number)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+    benchmarks.query_construction
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Measures the per call cost of building and running the queries made on
+    every request, with and without the compiled statement cache used by
+    :class:`yoshimi.repo.Query`.
+
+    The unbaked cases rebuild the query from its ops on every call like the
+    repository did before queries were baked. The prebuilt case reuses a
+    query built once.
+"""
+from yoshimi.content import Content
+from yoshimi.repo import Query
+from benchmarks import (
+    argument_parser,
+    report,
+    setup_database,
+)
+
+
+def main():
+    args = argument_parser(__doc__).parse_args()
+    session = setup_database(args.dsn)
+
+    root = Content(name='Root', slug='root')
+    section = Content(root, name='Section', slug='section')
+    for i in range(20):
+        Content(section, name='Article %s' % i, slug='article-%s' % i)
+    article = Content(section, name='Article', slug='article')
+    session.add(root)
+    session.commit()
+    article_id = article.id
+
+    def query(entities):
+        return Query(session, entities)
+
+    prebuilt_children = query(section).children().load_path()
+
+    report([
+        ('content_getter unbaked', lambda: query(Content).load_path()
+            .filter_by(id=article_id).one()),
+        ('content_getter baked', lambda: query(Content).load_path()
+            .by_id(article_id).one()),
+        ('children unbaked', lambda: query(section).children().load_path()
+            .get_query().all()),
+        ('children baked', lambda: query(section).children().load_path()
+            .all()),
+        ('children prebuilt', lambda: prebuilt_children.get_query().all()),
+    ], args.number)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+    benchmarks.trash
+    ~~~~~~~~~~~~~~~~
+
+    Times inserting subtrees of 1k, 10k and 100k content into the trash and
+    restoring them again, see :class:`yoshimi.trash.Trash`.
+
+    All subtrees live in the same tree so each one is trashed next to the
+    content of the others. Run it on SQLite with::
+
+        python -m benchmarks.trash
+
+    Use ``--sizes`` to pick other subtree sizes.
+"""
+import time
+from yoshimi.content import (
+    Content,
+    Path,
+)
+from yoshimi.trash import Trash
+from benchmarks import (
+    argument_parser,
+    setup_database,
+)
+
+FANOUT = 10
+
+
+def populate(connection, sizes):
+    """Inserts a root with one section per size holding a subtree of that
+    many content. Returns the ids of the sections."""
+    content, path = Content.__table__, Path.__table__
+    contents = [_content_row(1)]
+    paths = [{'ancestor': 1, 'descendant': 1, 'length': 0}]
+    lineages = {1: (1,)}
+    sections = []
+    next_id = 2
+    for size in sizes:
+        nodes = []
+        for i in range(size):
+            parent = nodes[(i - 1) // FANOUT] if i else 1
+            id, next_id = next_id, next_id + 1
+            nodes.append(id)
+            lineage = lineages[parent] + (id,)
+            lineages[id] = lineage
+            contents.append(_content_row(id))
+            paths.extend(
+                {'ancestor': a, 'descendant': id, 'length': n}
+                for n, a in enumerate(reversed(lineage))
+            )
+        sections.append(nodes[0])
+
+    connection.execute(content.insert(), contents)
+    connection.execute(path.insert(), paths)
+    return sections
+
+
+def _content_row(id):
+    return {
+        'id': id, 'type': 'content', 'name': 'Content %s' % id,
+        'slug': 'content-%s' % id, 'status_id': 0, 'child_count': 0,
+    }
+
+
+def main():
+    parser = argument_parser(__doc__, number=3)
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+        help='Number of content in each subtree'
+    )
+    args = parser.parse_args()
+    session = setup_database(args.dsn)
+    sections = populate(session.connection(), args.sizes)
+    if session.bind.dialect.name == 'sqlite':
+        session.execute('ANALYZE')
+    trash = Trash(session)
+
+    width = max(len(str(size)) for size in args.sizes)
+    for size, id in zip(args.sizes, sections):
+        inserts, restores = [], []
+        for i in range(args.number):
+            section = session.query(Content).get(id)
+            start = time.perf_counter()
+            trash.insert(section)
+            inserts.append(time.perf_counter() - start)
+
+            section = session.query(Content).get(id)
+            start = time.perf_counter()
+            trash.restore(section)
+            restores.append(time.perf_counter() - start)
+
+        print('%s nodes  insert %8.1f ms  restore %8.1f ms' % (
+            str(size).rjust(width),
+            min(inserts) * 1000,
+            min(restores) * 1000,
+        ))
+
+
+if __name__ == '__main__':
+    main()
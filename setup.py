@@ -66,7 +66,7 @@ setup(
     author_email='olemortenh@gmail.com',
     url='http://github.com/omh/yoshimi',
     keywords='web wsgi pyramid cms',
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks', 'benchmarks.*']),
     include_package_data=True,
     zip_safe=False,
     install_requires=requires,
@@ -80,5 +80,9 @@ setup(
         'fanstatic.libraries': [
             'yoshimi_admin = yoshimi.admin.fanstatic:library',
         ],
+        'console_scripts': [
+            'yoshimi-repair = yoshimi.scripts.repair:main',
+            'yoshimi-worker = yoshimi.scripts.worker:main',
+        ],
     },
 )
@@ -1,11 +1,14 @@
+from webob.multidict import MultiDict
 from tests.yoshimi import (
     Mock,
     patch
 )
+from yoshimi.content import Content
 from yoshimi.admin.views import (
     index,
     trash_empty,
     trash_index,
+    trash_restore,
 )
 
 
@@ -21,41 +24,42 @@ class TestTrashIndex:
         )
         self.lazy_pagination = LazyPagination.start()
 
-        page_number = patch('yoshimi.admin.views.page_number', autospec=True)
-        self.page_number = page_number.start()
-
     def teardown(self):
         patch.stopall()
 
     def test_can_not_select_without_parent(self):
         trash_content = Mock()
-        trash_content.content.parent = None
+        trash_content.parent_status_id = None
         rv = trash_index(Mock(), Mock())
 
         assert rv['can_select'](trash_content) is False
 
     def test_can_not_select_without_available_parent(self):
         trash_content = Mock()
-        trash_content.content.parent.is_available = False
+        trash_content.parent_status_id = Content.status.TRASHED
         rv = trash_index(Mock(), Mock())
 
         assert rv['can_select'](trash_content) is False
 
     def test_can_select_when_have_parent_and_is_available(self):
         trash_content = Mock()
-        trash_content.content.parent.is_available = True
+        trash_content.parent_status_id = Content.status.AVAILABLE
         rv = trash_index(Mock(), Mock())
 
         assert rv['can_select'](trash_content) is True
 
     def test_returns_trash_contents(self):
         request = Mock()
+        request.GET = {'cursor': 'abc'}
         trash_contents = Mock()
         self.lazy_pagination.return_value = trash_contents
 
         rv = trash_index(Mock(), request)
 
         request.y_repo.trash.items.assert_called_once_with()
+        self.lazy_pagination.assert_called_once_with(
+            request.y_repo.trash.items.return_value, cursor='abc'
+        )
         assert rv['trash_contents'] == trash_contents
 
 
@@ -70,3 +74,19 @@ class TestTrashEmpty:
         assert rv == '/return'
         request.y_repo.trash.empty.assert_called_once_with()
         redirect_back.assert_called_once_with(request, fallback='/redir')
+
+
+class TestTrashRestore:
+    @patch('yoshimi.admin.views.redirect_back')
+    def test_restores_selected_items(self, redirect_back):
+        redirect_back.return_value = '/return'
+        request = Mock()
+        request.POST = MultiDict([
+            ('trash_item_id', '1'),
+            ('trash_item_id', '2'),
+            ('trash_item_id', 'x'),
+        ])
+        rv = trash_restore(request)
+
+        assert rv == '/return'
+        request.y_repo.trash.restore_many.assert_called_once_with([1, 2])
@@ -0,0 +1,98 @@
+from tests.yoshimi import (
+    DatabaseTestCase,
+    QueryCountTestCase,
+    patch,
+)
+from tests.yoshimi.contenttypes import get_content
+from yoshimi.scripts.repair import (
+    main,
+    repair_child_counts,
+    repair_trash_count,
+    repair_url_paths,
+)
+from yoshimi.entities import Counter
+from yoshimi.trash import Trash
+
+
+class TestRepairChildCounts(DatabaseTestCase):
+    def test_recomputes_child_counts(self):
+        root = get_content()
+        child = get_content(parent=root)
+        get_content(parent=child)
+        self.s.add(root)
+        self.s.flush()
+        self.s.execute('UPDATE content SET child_count = 10')
+
+        repair_child_counts(self.s)
+        self.s.expire_all()
+
+        assert root.child_count == 1
+        assert child.child_count == 1
+
+
+class TestRepairTrashCount(DatabaseTestCase):
+    def test_recomputes_trash_count(self):
+        root = get_content()
+        get_content(parent=root)
+        self.s.add(root)
+        self.s.flush()
+        Trash(self.s).insert(root)
+        self.s.query(Counter).update({'value': 10})
+
+        assert repair_trash_count(self.s) == 'Recomputed trash count: 2'
+        assert Trash(self.s).count() == 2
+
+
+class TestRepairUrlPaths(QueryCountTestCase):
+    def test_recomputes_url_paths(self):
+        root = get_content(slug='root')
+        child = get_content(parent=root, slug='child')
+        grandchild = get_content(parent=child, slug='grandchild')
+        other = get_content(slug='other')
+        self.s.add_all([root, other])
+        self.s.flush()
+        self.s.execute("UPDATE content SET url_path = 'stale'")
+        self.s.execute(
+            "UPDATE content SET url_path = NULL WHERE id = %s" % child.id
+        )
+
+        rv = repair_url_paths(self.s)
+        self.s.expire_all()
+
+        assert rv == 'Recomputed url paths of 4 content'
+        assert root.url_path == 'root'
+        assert other.url_path == 'other'
+        assert child.url_path == 'root/child'
+        assert grandchild.url_path == 'root/child/grandchild'
+
+    def test_issues_at_most_one_update_per_level(self):
+        root = get_content(slug='root')
+        child = get_content(parent=root, slug='child')
+        for i in range(5):
+            get_content(parent=child, slug='c%s' % i)
+        self.s.add(root)
+        self.s.flush()
+
+        with self.count_queries():
+            repair_url_paths(self.s)
+
+        # Clear, top-level, two levels below it and the last empty level.
+        # Databases seeing rows updated earlier in the same statement may
+        # fill in more than one level at a time.
+        assert len(self.statements) <= 5
+
+
+class TestMain:
+    @patch('yoshimi.scripts.repair.db')
+    @patch('yoshimi.scripts.repair.get_appsettings')
+    @patch('yoshimi.scripts.repair.setup_logging')
+    def test_runs_command_and_commits(self, setup_logging, get_appsettings,
+                                      db):
+        command = patch.dict(
+            'yoshimi.scripts.repair.COMMANDS', {'child-counts': lambda s: ''}
+        )
+        with command:
+            main(['yoshimi-repair', 'development.ini', 'child-counts'])
+
+        get_appsettings.assert_called_once_with('development.ini')
+        db.Session.return_value.commit.assert_called_once_with()
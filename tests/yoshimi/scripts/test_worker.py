@@ -0,0 +1,65 @@
+from datetime import timedelta
+from tests.yoshimi import (
+    Mock,
+    patch,
+)
+from yoshimi.scripts.worker import (
+    main,
+    worker_from_settings,
+)
+from yoshimi.trash import Trash
+
+
+class TestWorkerFromSettings:
+    def test_defaults(self):
+        worker = worker_from_settings(Mock(), {})
+
+        assert worker.batch_size == 500
+        assert worker.sleep == 0
+        assert worker.hooks == []
+        assert worker.retention is None
+
+    def test_from_settings(self):
+        worker = worker_from_settings(Mock(), {
+            'yoshimi.worker.batch_size': '10',
+            'yoshimi.worker.sleep': '0.5',
+            'yoshimi.worker.hooks': 'yoshimi.trash.Trash',
+            'yoshimi.trash.retention_days': '30',
+        })
+
+        assert worker.batch_size == 10
+        assert worker.sleep == 0.5
+        assert worker.hooks == [Trash]
+        assert worker.retention == timedelta(days=30)
+
+    def test_arguments_override_settings(self):
+        worker = worker_from_settings(
+            Mock(), {'yoshimi.worker.batch_size': '10'}, batch_size=20,
+            sleep=1,
+        )
+
+        assert worker.batch_size == 20
+        assert worker.sleep == 1
+
+
+class TestMain:
+    @patch('yoshimi.scripts.worker.DeletionWorker')
+    @patch('yoshimi.scripts.worker.db')
+    @patch('yoshimi.scripts.worker.get_appsettings')
+    @patch('yoshimi.scripts.worker.setup_logging')
+    def test_runs_worker(self, setup_logging, get_appsettings, db, worker):
+        get_appsettings.return_value = {}
+
+        main([
+            'yoshimi-worker', 'development.ini', '--batch-size', '5',
+            '--max-batches', '2',
+        ])
+
+        get_appsettings.assert_called_once_with('development.ini')
+        worker.assert_called_once_with(
+            db.Session.return_value, 5, 0.0, [], retention=None
+        )
+        run = worker.return_value.run
+        assert run.call_count == 1
+        assert run.call_args[1]['max_batches'] == 2
+        db.Session.return_value.close.assert_called_once_with()
@@ -0,0 +1,83 @@
+from yoshimi.cache import (
+    get_region,
+    set_region,
+    setup_cache,
+    DEFAULT_TTLS,
+    LRUCache,
+)
+
+
+class TestLRUCache:
+    def setup(self):
+        self.now = 0
+        self.cache = LRUCache(maxsize=2, ttl=10, timer=lambda: self.now)
+
+    def test_get_returns_default_when_missing(self):
+        assert self.cache.get('a', 'default') == 'default'
+
+    def test_set_and_get(self):
+        self.cache.set('a', 1)
+
+        assert self.cache.get('a') == 1
+
+    def test_evicts_least_recently_used(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+
+        assert self.cache.get('a') == 1
+        assert self.cache.get('b') is None
+        assert self.cache.get('c') == 3
+
+    def test_entries_expire(self):
+        self.cache.set('a', 1)
+        self.now = 10
+
+        assert self.cache.get('a') is None
+        assert len(self.cache) == 0
+
+    def test_delete_many(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+
+        self.cache.delete_many(['a', 'b', 'c'])
+
+        assert len(self.cache) == 0
+
+
+class TestRegions:
+    def teardown(self):
+        set_region('totals', None)
+
+    def test_region_is_disabled_by_default(self):
+        assert get_region('totals') is None
+
+    def test_setup_cache_from_settings(self):
+        setup_cache({
+            'yoshimi.cache.totals': 'true',
+            'yoshimi.cache.totals.maxsize': '5',
+            'yoshimi.cache.totals.ttl': '60',
+        })
+
+        cache = get_region('totals')
+        assert cache.maxsize == 5
+        assert cache.ttl == 60
+
+    def test_setup_cache_has_finite_ttl_by_default(self):
+        setup_cache({'yoshimi.cache.totals': 'true'})
+
+        assert get_region('totals').ttl == DEFAULT_TTLS['totals']
+
+    def test_setup_cache_without_ttl(self):
+        setup_cache({
+            'yoshimi.cache.totals': 'true',
+            'yoshimi.cache.totals.ttl': 'none',
+        })
+
+        assert get_region('totals').ttl is None
+
+    def test_setup_cache_skips_disabled_regions(self):
+        setup_cache({'yoshimi.cache.totals': 'false'})
+
+        assert get_region('totals') is None
@@ -1,4 +1,9 @@
 from yoshimi.content import Content
+from yoshimi.content import Path
+from yoshimi.cache import LRUCache
+from yoshimi.cache import set_region
+from tests.yoshimi import DatabaseTestCase
+from tests.yoshimi import QueryCountTestCase
 from tests.yoshimi.contenttypes import get_content
 
 
@@ -52,3 +57,284 @@ class TestContent:
         assert len(child.paths) == 2
         assert child._sorted_paths()[0].length == 1
         assert child._sorted_paths()[1].length == 0
+
+
+class TestContentUrlPath:
+    def test_url_path_of_root(self):
+        assert get_content(slug='root').url_path == 'root'
+
+    def test_url_path_includes_parent(self):
+        root = get_content(slug='root')
+        child = get_content(parent=root, slug='child')
+
+        assert child.url_path == 'root/child'
+
+    def test_url_path_when_slug_is_set_after_creation(self):
+        root = get_content(slug='root')
+        child = Content(parent=root)
+        child.slug = 'child'
+
+        assert child.url_path == 'root/child'
+
+    def test_url_path_follows_slug_changes(self):
+        child = get_content(parent=get_content(slug='root'), slug='child')
+
+        child.slug = 'new-child'
+
+        assert child.url_path == 'root/new-child'
+
+    def test_url_path_is_unknown_below_parent_without_url_path(self):
+        root = get_content(slug='root')
+        root.url_path = None
+        child = get_content(parent=root, slug='child')
+
+        assert child.url_path is None
+
+
+class TestContentChildCount:
+    def test_new_content_increments_parent(self):
+        root = get_content()
+        get_content(parent=root)
+        get_content(parent=root)
+
+        assert root.child_count == 2
+        assert root.has_children is True
+
+    def test_only_available_content_is_counted(self):
+        root = get_content()
+        get_content(parent=root, status_id=Content.status.TRASHED)
+
+        assert root.has_children is False
+
+
+class TestContentLineageCache:
+    def test_sorted_paths_are_cached(self):
+        root = get_content()
+        child = get_content(parent=root)
+
+        assert child._sorted_paths() is child._sorted_paths()
+
+    def test_lineage_is_a_copy(self):
+        child = get_content(parent=get_content())
+
+        child.lineage.pop()
+
+        assert len(child.lineage) == 2
+
+    def test_cache_is_reset_when_paths_change(self):
+        root = get_content()
+        child = get_content(parent=root)
+        child.lineage
+        new_root = get_content()
+
+        child.paths.append(
+            Path(ancestor_content=new_root, descendant_content=child, length=2)
+        )
+
+        assert child.lineage[0] == new_root
+
+
+class TestContentLineageCacheExpiry(DatabaseTestCase):
+    def test_cache_is_reset_when_expired(self):
+        root = get_content(slug='root')
+        child = get_content(parent=root, slug='child')
+        self.s.add(root)
+        self.s.flush()
+        sorted_paths = child._sorted_paths()
+
+        self.s.expire(child)
+
+        assert child._sorted_paths() is not sorted_paths
+        assert child.slugs == ['root', 'child']
+
+    def test_cache_is_kept_when_other_attributes_are_expired(self):
+        child = get_content(parent=get_content())
+        self.s.add(child)
+        self.s.flush()
+        sorted_paths = child._sorted_paths()
+
+        self.s.expire(child, ['name'])
+
+        assert child._sorted_paths() is sorted_paths
+
+
+class TestContentUrlPathCascade(DatabaseTestCase):
+    def setup(self):
+        super().setup()
+        self.root = get_content(slug='root')
+        self.c1 = get_content(parent=self.root, slug='c1')
+        self.c2 = get_content(parent=self.c1, slug='c2')
+        self.other = get_content(slug='root-two')
+        self.s.add_all([self.root, self.other])
+        self.s.flush()
+
+    def test_slug_change_cascades_to_loaded_descendants(self):
+        self.root.slug = 'new-root'
+        self.s.flush()
+
+        assert self.c1.url_path == 'new-root/c1'
+        assert self.c2.url_path == 'new-root/c1/c2'
+
+    def test_slug_change_cascades_to_descendants_in_the_database(self):
+        self.c1.slug = 'new-c1'
+        self.s.flush()
+        self.s.expire_all()
+
+        assert self.root.url_path == 'root'
+        assert self.c1.url_path == 'root/new-c1'
+        assert self.c2.url_path == 'root/new-c1/c2'
+        assert self.other.url_path == 'root-two'
+
+
+class TestLoadLineages(QueryCountTestCase):
+    def setup(self):
+        super().setup()
+        self.root = get_content(name='root', slug='root')
+        self.c1 = get_content(parent=self.root, name='c1', slug='c1')
+        self.c2 = get_content(parent=self.c1, name='c2', slug='c2')
+        self.c3 = get_content(parent=self.root, name='c3', slug='c3')
+        self.s.add(self.root)
+        self.s.flush()
+        self.s.expire_all()
+
+    def test_loads_lineages_in_one_query(self):
+        from yoshimi.content import load_lineages
+        contents = self.s.query(Content).filter(
+            Content.id.in_([self.c2.id, self.c3.id])
+        ).order_by(Content.id).all()
+
+        with self.count_queries():
+            load_lineages(contents)
+            lineages = [[c.name for c in content.lineage]
+                        for content in contents]
+
+        self.assert_query_count_is(1)
+        assert lineages == [['root', 'c1', 'c2'], ['root', 'c3']]
+
+    def test_skips_content_with_lineage_loaded(self):
+        from yoshimi.content import load_lineages
+        self.c3.paths
+
+        with self.count_queries():
+            load_lineages([self.c3])
+
+        self.assert_query_count_is(0)
+
+
+class TestContentUrlCacheInvalidation(DatabaseTestCase):
+    def setup(self):
+        super().setup()
+        self.cache = LRUCache()
+        set_region('urls', self.cache)
+        self.root = get_content(slug='root')
+        self.c1 = get_content(parent=self.root, slug='c1')
+        self.c2 = get_content(parent=self.c1, slug='c2')
+        self.s.add(self.root)
+        self.s.flush()
+        for content in (self.root, self.c1, self.c2):
+            self.cache.set(content.id, {None: 'path'})
+
+    def teardown(self):
+        set_region('urls', None)
+        super().teardown()
+
+    def test_slug_change_invalidates_subtree(self):
+        self.c1.slug = 'new-c1'
+        self.s.flush()
+
+        assert self.cache.get(self.root.id) is not None
+        assert self.cache.get(self.c1.id) is None
+        assert self.cache.get(self.c2.id) is None
+
+    def test_slug_change_without_url_path_invalidates_subtree(self):
+        self.s.execute(Content.__table__.update().values(url_path=None))
+        self.s.expire_all()
+
+        self.c1.slug = 'new-c1'
+        self.s.flush()
+
+        assert self.c1.url_path is None
+        assert self.cache.get(self.root.id) is not None
+        assert self.cache.get(self.c1.id) is None
+        assert self.cache.get(self.c2.id) is None
+
+    def test_move_invalidates_subtree(self):
+        from yoshimi.repo import MoveOperation
+        other = get_content(slug='other')
+        self.s.add(other)
+        self.s.flush()
+
+        MoveOperation(self.s, self.c1).to(other)
+
+        assert self.cache.get(self.root.id) is not None
+        assert self.cache.get(self.c1.id) is None
+        assert self.cache.get(self.c2.id) is None
+
+
+class TestContentChildCountPersisted(DatabaseTestCase):
+    def test_new_content_increments_persisted_parent(self):
+        root = get_content()
+        get_content(parent=root)
+        self.s.add(root)
+        self.s.flush()
+
+        get_content(parent=root)
+        get_content(parent=root)
+        self.s.flush()
+
+        assert root.child_count == 3
+
+    def test_persisted_parent_has_python_value_before_flush(self):
+        root = get_content()
+        get_content(parent=root)
+        self.s.add(root)
+        self.s.commit()
+
+        get_content(parent=root)
+
+        assert root.child_count == 2
+        assert root.has_children is True
+
+    def test_increment_is_done_by_database(self):
+        root = get_content()
+        self.s.add(root)
+        self.s.flush()
+        get_content(parent=root)
+        # Simulate a concurrent insert below the same parent
+        self.s.execute(
+            Content.__table__.update().values(child_count=5)
+        )
+
+        self.s.flush()
+
+        assert root.child_count == 6
+
+    def _indexes(self, table):
+        return dict(
+            (index.name, tuple(c.name for c in index.columns))
+            for index in table.indexes
+        )
+
+    def test_content_indexes(self):
+        indexes = self._indexes(Content.__table__)
+
+        assert indexes['ix_content_type'] == ('type',)
+        assert indexes['ix_content_status_id_type'] == ('status_id', 'type')
+
+    def test_path_indexes(self):
+        indexes = self._indexes(Path.__table__)
+
+        assert indexes['ix_path_descendant_length'] == (
+            'descendant', 'length'
+        )
+        assert indexes['ix_path_ancestor_length'] == ('ancestor', 'length')
+
+    def test_partial_index_for_available_content(self):
+        from sqlalchemy.dialects import postgresql, sqlite
+        from sqlalchemy.schema import CreateIndex
+        index = [i for i in Content.__table__.indexes
+                 if i.name == 'ix_content_available_type'][0]
+
+        for dialect in (postgresql.dialect(), sqlite.dialect()):
+            ddl = str(CreateIndex(index).compile(dialect=dialect))
+            assert ddl.endswith('WHERE status_id = 0')
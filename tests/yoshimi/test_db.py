@@ -0,0 +1,139 @@
+from datetime import datetime
+import pytest
+from pyramid.httpexceptions import HTTPNotFound
+from sqlalchemy.orm import joinedload
+from tests.yoshimi import QueryCountTestCase
+from tests.yoshimi.contenttypes import get_content
+from yoshimi.content import Content
+from yoshimi.db import (
+    decode_cursor,
+    encode_cursor,
+    InvalidCursor,
+)
+
+
+class TestCursor:
+    def test_roundtrip(self):
+        values = [1, 'a', datetime(2013, 1, 2, 3, 4, 5, 6)]
+
+        assert decode_cursor(encode_cursor(values)) == (values, False)
+
+    def test_roundtrip_backwards(self):
+        assert decode_cursor(encode_cursor([1], True)) == ([1], True)
+
+    def test_invalid_cursor(self):
+        with pytest.raises(InvalidCursor):
+            decode_cursor('not a cursor')
+
+
+class TestPaginate(QueryCountTestCase):
+    def setup(self):
+        super().setup()
+        self.contents = [get_content(name='c%s' % i) for i in range(7)]
+        self.s.add_all(self.contents)
+        self.s.flush()
+        self.query = self.s.query(Content).order_by(Content.id)
+
+    def test_counts_in_the_same_statement(self):
+        with self.count_queries():
+            page = self.query.paginate(2, per_page=3)
+
+        self.assert_query_count_is(1)
+        assert page.items == self.contents[3:6]
+        assert page.total == 7
+
+    def test_counts_with_eager_loaded_collections(self):
+        page = self.query.options(joinedload(Content.paths)).paginate(2, 3)
+
+        assert page.items == self.contents[3:6]
+        assert page.total == 7
+
+    def test_separate_count_without_window_count(self):
+        with self.count_queries():
+            page = self.query.paginate(2, per_page=3, window_count=False)
+
+        self.assert_query_count_is(2)
+        assert page.total == 7
+
+    def test_given_total_is_used(self):
+        with self.count_queries():
+            page = self.query.paginate(2, per_page=3, total=100)
+
+        self.assert_query_count_is(1)
+        assert 'OVER' not in self.statements[0]
+        assert page.total == 100
+
+    def test_counts_past_the_last_page(self):
+        page = self.query.paginate(5, per_page=3, error_out=False)
+
+        assert page.items == []
+        assert page.total == 7
+
+
+class TestPaginateAfter(QueryCountTestCase):
+    def setup(self):
+        super().setup()
+        self.contents = [
+            get_content(name='c%s' % (i % 3)) for i in range(7)
+        ]
+        self.s.add_all(self.contents)
+        self.s.flush()
+        self.query = self.s.query(Content)
+
+    def test_first_page(self):
+        page = self.query.paginate_after(None, per_page=3)
+
+        assert page.items == self.contents[:3]
+        assert page.has_prev is False
+        assert page.has_next is True
+        assert page.prev_cursor is None
+
+    def test_walks_all_pages(self):
+        page = self.query.paginate_after(None, per_page=3)
+        items = list(page.items)
+        while page.has_next:
+            page = page.next()
+            items.extend(page.items)
+
+        assert items == self.contents
+        assert page.has_prev is True
+        assert page.next_cursor is None
+
+    def test_prev(self):
+        page = self.query.paginate_after(None, per_page=3).next().next()
+
+        prev = page.prev()
+
+        assert prev.items == self.contents[3:6]
+        assert prev.has_prev is True
+        assert prev.has_next is True
+        assert prev.prev().items == self.contents[:3]
+        assert prev.prev().has_prev is False
+
+    def test_uses_query_ordering_with_primary_key_as_tie_breaker(self):
+        query = self.query.order_by(Content.name.desc())
+        expected = sorted(
+            self.contents, key=lambda c: (c.name, -c.id), reverse=True
+        )
+
+        page = query.paginate_after(None, per_page=4)
+        items = page.items + page.next().items
+
+        assert items == expected
+
+    def test_page_costs_one_query(self):
+        cursor = self.query.paginate_after(None, per_page=3).next_cursor
+
+        with self.count_queries():
+            self.query.paginate_after(cursor, per_page=3)
+
+        self.assert_query_count_is(1)
+
+    def test_invalid_cursor_raises_404(self):
+        with pytest.raises(HTTPNotFound):
+            self.query.paginate_after('invalid')
+
+    def test_invalid_cursor_without_error_out_returns_first_page(self):
+        page = self.query.paginate_after('invalid', 3, error_out=False)
+
+        assert page.items == self.contents[:3]
@@ -18,6 +18,7 @@ from yoshimi.repo import (
     Query,
     MoveOperation,
     DeleteOperation,
+    BulkInsertOperation,
     _QueryExtensions,
 )
 from yoshimi.content import (
@@ -25,6 +26,11 @@ from yoshimi.content import (
     Content,
 )
 from yoshimi.trash import Trash
+from yoshimi.cache import (
+    get_region,
+    set_region,
+    LRUCache,
+)
 
 # @TODO test children query does not trigger extra query when accessing content
 # type attributes, e.g article.title
@@ -90,6 +96,26 @@ class TestQueryEagerLoading(QueryCountTestCase):
 
         self.assert_query_count_is(1)
 
+    @pytest.mark.parametrize('children_count', [1, 10])
+    def test_load_path_with_children_loads_lineage(self, children_count):
+        root = get_folder(name='root')
+        section = get_folder(root, name='section')
+        for i in range(children_count):
+            get_article(section, name='a%s' % i)
+        self.add_object(root)
+        section_id = section.id
+        self.s.expunge_all()
+        section = self.s.query(Folder).get(section_id)
+
+        with self.count_queries():
+            children = Query(self.s, section).children().load_path().all()
+            for child in children:
+                child.slugs
+                child.parent.name
+
+        assert len(children) == children_count
+        self.assert_query_count_is(1)
+
 
 class TestQuery:
     def test_extension(self):
@@ -104,6 +130,55 @@ class TestQuery:
         assert callable.call_count == 1
 
 
+class TestQueryIsGenerative:
+    def setup(self):
+        self.session = Mock()
+        self.query = Query(self.session, Content)
+
+    def test_ops_return_new_query(self):
+        children = self.query.children()
+        depth = children.depth(2)
+
+        assert children is not self.query
+        assert depth is not children
+        assert self.query._destructive_op == {}
+        assert 'depth' not in children._ops
+        assert depth._ops['depth'].args == (2,)
+
+    def test_extensions_return_new_query(self):
+        query = Query(self.session, Content, {'ext': Mock()})
+
+        assert query.ext('a') is not query
+        assert query._ops == {}
+
+    def test_get_query_is_memoized(self):
+        assert self.query.get_query() is self.query.get_query()
+        assert self.session.query.call_count == 1
+
+    def test_with_session(self):
+        session = Mock()
+        self.query.get_query()
+
+        query = self.query.with_session(session)
+        query.get_query()
+
+        assert query.session is session
+        assert self.query.session is self.session
+        assert session.query.call_count == 1
+
+
+class TestQueryReuse(DatabaseTestCase):
+    def test_prebuilt_query_with_session(self):
+        root = get_folder(name='root')
+        a1 = get_article(root, name='a1')
+        self.s.add(root)
+        self.s.flush()
+        query = Query(None, Article).load_path()
+
+        assert query.with_session(self.s).all() == [a1]
+        assert query.with_session(self.s).get_query().count() == 1
+
+
 class TestQueryChildren(DatabaseTestCase):
     def setup(self):
         super().setup()
@@ -170,6 +245,289 @@ class TestQueryChildren(DatabaseTestCase):
         assert len(children) == 6
 
 
+class TestQueryBaked(DatabaseTestCase):
+    def setup(self):
+        super().setup()
+        # - root
+        # - - f1
+        # - - - a1
+        # - - - a2 (trashed)
+        # - - f2
+        # - - - a3
+        self.root = get_folder(name='root')
+        self.f1 = get_folder(self.root, name='f1')
+        self.f2 = get_folder(self.root, name='f2')
+        self.a1 = get_article(self.f1, name='a1')
+        self.a2 = get_article(self.f1, name='a2')
+        self.a3 = get_article(self.f2, name='a3')
+        self.s.add(self.root)
+        self.s.flush()
+        self.a2.status_id = Content.status.TRASHED
+        self.s.flush()
+
+    def test_children_are_baked(self):
+        assert Query(self.s, self.f1).children()._baked() is not None
+
+    def test_parameters_are_bound_per_call(self):
+        f1_children = Query(self.s, self.f1).children().all()
+        f2_children = Query(self.s, self.f2).children().all()
+        root_children = Query(self.s, self.root).children().depth(2).all()
+
+        assert f1_children == [self.a1]
+        assert f2_children == [self.a3]
+        assert set(root_children) == set([self.f1, self.f2, self.a1, self.a3])
+
+    def test_content_types_are_part_of_the_cache_key(self):
+        folders = Query(self.s, self.root).children(Folder).depth(2).all()
+        articles = Query(self.s, self.root).children(Article).depth(2).all()
+
+        assert set(folders) == set([self.f1, self.f2])
+        assert set(articles) == set([self.a1, self.a3])
+
+    def test_by_id(self):
+        query = Query(self.s, Content).load_path().by_id(self.a1.id)
+
+        assert query.one() == self.a1
+        assert Query(self.s, Content).by_id(self.a2.id).first() is None
+
+    def test_load_path_shares_statement_between_parents(self):
+        from yoshimi.repo import bakery
+        Query(self.s, self.f1).children().load_path().all()
+        size = len(bakery.cache)
+
+        children = Query(self.s, self.f2).children().load_path().all()
+
+        assert children == [self.a3]
+        assert len(bakery.cache) == size
+
+    def test_status_is_part_of_the_cache_key(self):
+        available = Query(self.s, Content).by_id(self.a2.id).first()
+        trashed = Query(self.s, Content).by_id(self.a2.id) \
+            .status(Content.status.TRASHED).first()
+
+        assert available is None
+        assert trashed == self.a2
+
+    def test_query_with_extension_is_not_baked(self):
+        query = Query(self.s, Content, {'ext': lambda q: q()})
+
+        assert query.ext()._baked() is None
+
+    def test_query_for_content_instance_is_not_baked(self):
+        assert Query(self.s, self.f1)._baked() is None
+
+
+class TestQueryPaginateTotalsCache(QueryCountTestCase):
+    def setup(self):
+        super().setup()
+        set_region('totals', LRUCache())
+        self.root = get_folder(name='root')
+        self.f1 = get_folder(self.root, name='f1')
+        self.f2 = get_folder(self.root, name='f2')
+        for i in range(5):
+            get_article(self.f1, name='a%s' % i)
+        self.s.add(self.root)
+        self.s.flush()
+
+    def teardown(self):
+        set_region('totals', None)
+        super().teardown()
+
+    def test_total_is_cached(self):
+        Query(self.s, self.f1).children().paginate(1, per_page=2)
+
+        with self.count_queries():
+            page = Query(self.s, self.f1).children().paginate(2, per_page=2)
+
+        assert page.total == 5
+        assert 'OVER' not in self.statements[0]
+        self.assert_query_count_is(1)
+
+    def test_total_is_cached_per_query(self):
+        Query(self.s, self.f1).children(Folder).paginate(1, per_page=2)
+        page = Query(self.s, self.f1).children(Article).paginate(1, 2)
+
+        assert page.total == 5
+
+    def test_insert_invalidates_parent(self):
+        Query(self.s, self.f1).children().paginate(1, per_page=2)
+
+        self.s.add(get_article(self.f1, name='new'))
+        self.s.flush()
+
+        assert get_region('totals').get(self.f1.id) is None
+        assert Query(self.s, self.f1).children().paginate(1, 2).total == 6
+
+    def test_trash_invalidates_parent(self):
+        Query(self.s, self.f1).children().paginate(1, per_page=2)
+        child = Query(self.s, self.f1).children().first()
+
+        Trash(self.s).insert(child)
+
+        assert get_region('totals').get(self.f1.id) is None
+
+    def test_bulk_insert_invalidates_parent(self):
+        Query(self.s, self.f1).children().paginate(1, per_page=2)
+
+        BulkInsertOperation(self.s).insert(
+            self.f1, [{'name': 'b%s' % i, 'slug': 'b%s' % i} for i in range(3)]
+        )
+
+        assert get_region('totals').get(self.f1.id) is None
+        assert Query(self.s, self.f1).children().paginate(1, 2).total == 8
+
+    def test_move_invalidates_old_and_new_parent(self):
+        Query(self.s, self.f1).children().paginate(1, per_page=2)
+        Query(self.s, self.f2).children().paginate(1, per_page=2)
+        child = Query(self.s, self.f1).children().first()
+
+        MoveOperation(self.s, child).to(self.f2)
+
+        assert get_region('totals').get(self.f1.id) is None
+        assert get_region('totals').get(self.f2.id) is None
+
+
+class TestChildrenOf(QueryCountTestCase):
+    def setup(self):
+        super().setup()
+        # - root
+        # - - f1
+        # - - - a1, a2, a3
+        # - - f2
+        # - - - a4
+        # - - a5 (trashed)
+        self.root = get_folder(name='root')
+        self.f1 = get_folder(self.root, name='f1')
+        self.f2 = get_folder(self.root, name='f2')
+        self.a1 = get_article(self.f1, name='a1')
+        self.a2 = get_article(self.f1, name='a2')
+        self.a3 = get_article(self.f1, name='a3')
+        self.a4 = get_article(self.f2, name='a4')
+        self.a5 = get_article(self.root, name='a5')
+        self.a5.status_id = Content.status.TRASHED
+        self.s.add(self.root)
+        self.s.flush()
+
+        from yoshimi.repo import children_of
+        self.fut = children_of
+
+    def test_children_of_many_parents_in_one_query(self):
+        with self.count_queries():
+            rv = self.fut(self.s, [self.root, self.f1, self.f2.id])
+
+        self.assert_query_count_is(1)
+        assert rv == {
+            self.root.id: [self.f1, self.f2],
+            self.f1.id: [self.a1, self.a2, self.a3],
+            self.f2.id: [self.a4],
+        }
+
+    def test_filter_by_content_type(self):
+        rv = self.fut(self.s, [self.root], Article, depth=2)
+
+        assert rv[self.root.id] == [self.a1, self.a2, self.a3, self.a4]
+
+    def test_depth(self):
+        rv = self.fut(self.s, [self.root], depth=2)
+
+        assert len(rv[self.root.id]) == 6
+        assert rv[self.root.id][:2] == [self.f1, self.f2]
+
+    def test_limit_per_parent(self):
+        rv = self.fut(self.s, [self.f1, self.f2], limit_per_parent=2)
+
+        assert rv[self.f1.id] == [self.a1, self.a2]
+        assert rv[self.f2.id] == [self.a4]
+
+    @patch('yoshimi.repo.supports_window_functions', return_value=False)
+    def test_limit_per_parent_without_window_functions(self, _):
+        rv = self.fut(self.s, [self.f1, self.f2], limit_per_parent=2)
+
+        assert rv[self.f1.id] == [self.a1, self.a2]
+        assert rv[self.f2.id] == [self.a4]
+
+    def test_without_parents(self):
+        with self.count_queries():
+            assert self.fut(self.s, []) == {}
+
+        self.assert_query_count_is(0)
+
+
+class TestTree(QueryCountTestCase):
+    def setup(self):
+        super().setup()
+        # - root
+        # - - f1
+        # - - - f2
+        # - - - - a1
+        # - - - a2
+        # - - a3
+        # - - f3 (trashed)
+        # - - - a4
+        self.root = get_folder(name='root')
+        self.f1 = get_folder(self.root, name='f1')
+        self.f2 = get_folder(self.f1, name='f2')
+        self.a1 = get_article(self.f2, name='a1')
+        self.a2 = get_article(self.f1, name='a2')
+        self.a3 = get_article(self.root, name='a3')
+        self.f3 = get_folder(self.root, name='f3')
+        self.a4 = get_article(self.f3, name='a4')
+        self.s.add(self.root)
+        self.s.flush()
+        self.f3.status_id = Content.status.TRASHED
+        self.s.flush()
+
+        from yoshimi.repo import tree
+        self.fut = tree
+
+    def _names(self, nodes):
+        return [node.name for node in nodes]
+
+    def test_assembles_subtree_in_one_query(self):
+        with self.count_queries():
+            root = self.fut(self.s, self.root)
+
+        self.assert_query_count_is(1)
+        assert root.id == self.root.id
+        assert root.parent_id is None
+        assert self._names(root.children) == ['f1', 'a3']
+        f1 = root.children[0]
+        assert f1.parent_id == self.root.id
+        assert self._names(f1.children) == ['f2', 'a2']
+        assert self._names(f1.children[0].children) == ['a1']
+
+    def test_subtree_of_non_root_content(self):
+        f1 = self.fut(self.s, self.f1.id)
+
+        assert f1.parent_id == self.root.id
+        assert self._names(f1.children) == ['f2', 'a2']
+
+    def test_depth(self):
+        root = self.fut(self.s, self.root, depth=1)
+
+        f1 = root.children[0]
+        assert f1.children == []
+        assert f1.has_children is True
+
+    def test_filter_by_content_type(self):
+        root = self.fut(self.s, self.root, content_types=(Folder,))
+
+        assert self._names(root.children) == ['f1']
+        assert self._names(root.children[0].children) == ['f2']
+
+    def test_unavailable_root(self):
+        assert self.fut(self.s, self.f3) is None
+
+    def test_node_attributes(self):
+        root = self.fut(self.s, self.root)
+
+        f2 = root.children[0].children[0]
+        assert f2.slug == self.f2.slug
+        assert f2.type == 'folder'
+        assert f2.url_path == self.f2.url_path
+        assert f2.child_count == 1
+
+
 class TestQueryStatus(DatabaseTestCase):
     def setup(self):
         super().setup()
@@ -188,6 +546,24 @@ class TestQueryStatus(DatabaseTestCase):
         assert len(rv) == 1
         assert rv[0] == self.a2
 
+    def test_available_content_can_use_partial_index(self):
+        if self.s.bind.dialect.name != 'sqlite':
+            pytest.skip('Checks the SQLite query plan')
+        # SQLite prefers ix_content_status_id_type when both apply, drop it
+        # (rolled back with the test) to see if the partial index is usable
+        self.s.execute('DROP INDEX ix_content_status_id_type')
+        self.s.execute('ANALYZE')
+        query = Query(self.s, Content).filter(Content.type == 'article')
+        compiled = query.statement.compile(self.s.bind)
+        params = [compiled.params[name] for name in compiled.positiontup]
+
+        plan = self.s.connection().connection.execute(
+            'EXPLAIN QUERY PLAN %s' % compiled, params
+        ).fetchall()
+
+        assert 'content.status_id = 0' in str(compiled)
+        assert 'ix_content_available_type' in ' '.join(r[-1] for r in plan)
+
 
 class TestContentGetter(DatabaseTestCase):
     def setup(self):
@@ -211,8 +587,130 @@ class TestContentGetter(DatabaseTestCase):
             self.fut(self.repo, 999)
 
 
+class TestContentGetterCache(QueryCountTestCase):
+    def setup(self):
+        super().setup()
+        from yoshimi.repo import content_getter
+        self.fut = content_getter
+        self.cache = LRUCache()
+        set_region('content', self.cache)
+
+        self.root = get_folder(name='root', slug='root')
+        self.f1 = get_folder(self.root, name='f1', slug='f1')
+        self.a1 = get_article(self.f1, name='a1', slug='a1')
+        self.s.add(self.root)
+        self.s.flush()
+
+        self.repo = get_repo_mock(session=self.s)
+
+    def teardown(self):
+        set_region('content', None)
+        super().teardown()
+
+    def _cache(self, *contents):
+        # Content in the session isn't cached so fetch it with another one
+        from sqlalchemy.orm import Session
+        session = Session(bind=self.connection)
+        repo = get_repo_mock(session=session)
+        for content in contents:
+            self.fut(repo, content.id)
+        session.close()
+
+    def test_cached_content_is_merged_without_queries(self):
+        self._cache(self.a1)
+        self.s.expunge_all()
+
+        with self.count_queries():
+            rv = self.fut(self.repo, self.a1.id)
+            lineage = [c.name for c in rv.lineage]
+            url_path = rv.url_path
+
+        self.assert_query_count_is(0)
+        assert rv in self.s
+        assert lineage == ['root', 'f1', 'a1']
+        assert url_path == 'root/f1/a1'
+
+    def test_unflushed_changes_are_not_overwritten(self):
+        self._cache(self.a1)
+        self.s.expunge_all()
+        content = self.fut(self.repo, self.a1.id)
+        content.name = 'changed'
+
+        rv = self.fut(self.repo, self.a1.id)
+        self.s.flush()
+
+        assert rv is content
+        assert rv.name == 'changed'
+        assert self.s.execute(
+            'SELECT name FROM content WHERE id = %s' % content.id
+        ).scalar() == 'changed'
+
+    def test_changing_ancestor_slug_invalidates_descendants(self):
+        self._cache(self.root, self.f1, self.a1)
+
+        self.f1.slug = 'new-slug'
+        self.s.flush()
+
+        assert self.cache.get(self.root.id) is not None
+        assert self.cache.get(self.f1.id) is None
+        assert self.cache.get(self.a1.id) is None
+
+    def test_new_child_invalidates_parent(self):
+        self._cache(self.f1, self.a1)
+
+        self.s.add(get_article(self.f1, name='a2'))
+        self.s.flush()
+
+        assert self.cache.get(self.f1.id) is None
+        assert self.cache.get(self.a1.id) is not None
+
+    def test_move_invalidates_subtree_and_parents(self):
+        f2 = get_folder(self.root, name='f2')
+        self.s.add(f2)
+        self.s.flush()
+        self._cache(self.root, self.f1, self.a1, f2)
+
+        MoveOperation(self.s, self.a1).to(f2)
+
+        assert self.cache.get(self.root.id) is not None
+        assert len(self.cache) == 1
+
+    def test_delete_invalidates_subtree_and_parent(self):
+        self._cache(self.root, self.f1, self.a1)
+
+        DeleteOperation(self.s).delete(self.f1)
+
+        assert len(self.cache) == 0
+
+    def test_trash_invalidates_subtree_and_parent(self):
+        self._cache(self.root, self.f1, self.a1)
+
+        Trash(self.s).insert(self.f1)
+
+        assert len(self.cache) == 0
+
+
 @all_databases
 class TestMoveOperation(DatabaseTestCase):
+    def test_to_only_expires_affected_objects(self):
+        root = get_folder(name='f1')
+        subject = get_folder(root, name='s')
+        child = get_article(subject, name='a1')
+        new_parent = get_folder(root, name='new')
+        other = get_folder(name='other')
+        other_child = get_article(other, name='a2')
+        self.s.add_all([root, other])
+        self.s.flush()
+        other_child.lineage
+
+        MoveOperation(self.s, subject).to(new_parent)
+
+        assert 'name' in other.__dict__
+        assert 'name' in other_child.__dict__
+        assert 'paths' in other_child.__dict__
+        assert 'url_path' not in child.__dict__
+        assert [c.name for c in child.lineage] == ['f1', 'new', 's', 'a1']
+
     def test_to(self):
         root = get_folder(name='f1')
         subject = get_article(root, name='a1')
@@ -225,6 +723,34 @@ class TestMoveOperation(DatabaseTestCase):
 
         assert subject.parent == new_parent
 
+    def test_to_updates_child_counts(self):
+        root = get_folder(name='f1')
+        old_parent = get_folder(root, name='old')
+        subject = get_article(old_parent, name='a1')
+        new_parent = get_folder(root, name='new')
+        self.s.add(root)
+        self.s.commit()
+
+        MoveOperation(self.s, subject).to(new_parent)
+
+        assert old_parent.child_count == 0
+        assert new_parent.child_count == 1
+        assert root.child_count == 2
+
+    def test_to_updates_url_paths_of_subtree(self):
+        root = get_folder(name='f1', slug='root')
+        subject = get_folder(root, name='s', slug='subject')
+        child = get_article(subject, name='a1', slug='child')
+        new_parent = get_folder(root, name='f2', slug='new-parent')
+        self.s.add(root)
+        self.s.commit()
+
+        MoveOperation(self.s, subject).to(new_parent)
+
+        assert subject.url_path == 'root/new-parent/subject'
+        assert child.url_path == 'root/new-parent/subject/child'
+        assert new_parent.url_path == 'root/new-parent'
+
 
 @all_databases
 class TestDeleteOperation(DatabaseTestCase):
@@ -271,6 +797,12 @@ class TestDeleteOperation(DatabaseTestCase):
             folder_count=self.folder_count - 1,
         )
 
+    def test_delete_updates_parent_child_count(self):
+        self.fut.delete(self.child2)
+        self.s.expire_all()
+
+        assert self.child1.child_count == 0
+
     def test_delete_subtree(self):
         self.fut.delete(self.root)
         self.assertSubtree(
@@ -280,6 +812,113 @@ class TestDeleteOperation(DatabaseTestCase):
             folder_count=self.folder_count - 2,
         )
 
+    def test_delete_subtree_in_batches(self):
+        progress = Mock()
+        deleted = []
+
+        def commit():
+            deleted.append(self.s.query(Content).count())
+            self.s.commit()
+
+        self.fut.delete(
+            self.root, batch_size=2, progress=progress, commit=commit
+        )
+
+        self.assertSubtree(
+            path_count=self.path_count - 6,
+            content_count=self.content_count - 3,
+            article_count=self.article_count - 1,
+            folder_count=self.folder_count - 2,
+        )
+        assert deleted == [4, 3]
+        progress.assert_called_with(3, 3)
+
+    def test_batches_use_commit_from_session_info(self):
+        commit = Mock()
+        self.s.info['yoshimi.commit'] = commit
+        try:
+            self.fut.delete(self.root, batch_size=2)
+        finally:
+            del self.s.info['yoshimi.commit']
+
+        assert commit.call_count == 2
+
+    def test_batches_update_parent_child_count_with_last_chunk(self):
+        counts = []
+
+        def commit():
+            counts.append(self.s.query(Content.child_count).filter_by(
+                id=self.child1.id
+            ).scalar())
+
+        self.fut.delete(self.child2, batch_size=1, commit=commit)
+
+        assert counts == [0]
+
+    def test_batches_delete_deepest_content_first(self):
+        def commit():
+            raise RuntimeError
+        ids = [self.root.id, self.child1.id, self.child2.id]
+
+        with pytest.raises(RuntimeError):
+            self.fut.delete(self.root, batch_size=1, commit=commit)
+
+        remaining = set(id for id, in self.s.query(Content.id))
+        assert ids[2] not in remaining
+        assert set(ids[:2]) <= remaining
+
+    def test_batches_update_parent_child_count(self):
+        self.fut.delete(self.child2, batch_size=10)
+        self.s.expire_all()
+
+        assert self.child1.child_count == 0
+
+    def test_delete_updates_trash_count(self):
+        trash = Trash(self.s)
+        trash.insert(self.child1)
+        trash.insert(self.child3)
+
+        self.fut.delete(self.root)
+
+        assert trash.count() == 2
+        assert trash.recount() == 2
+
+    def test_interrupted_batches_keep_trash_count(self):
+        trash = Trash(self.s)
+        trash.insert(self.child1)
+        trash.insert(self.child3)
+        self.s.commit()
+        commits = []
+
+        def commit():
+            if len(commits) == 1:
+                raise RuntimeError
+            commits.append(True)
+            self.s.commit()
+
+        with pytest.raises(RuntimeError):
+            self.fut.delete(self.root, batch_size=1, commit=commit)
+
+        # child2 and child1 were deleted by the first two chunks
+        assert trash.count() == 2
+        assert trash.recount() == 2
+
+        self.fut.delete(self.s.query(Content).get(self.root.id), batch_size=1)
+
+        assert trash.count() == 2
+        assert trash.recount() == 2
+
+    def test_dry_run(self):
+        counts = self.fut.delete(self.root, dry_run=True)
+
+        assert counts == {'content': 3, 'path': 6, 'trash': 0}
+        self.assertSubtree(
+            path_count=self.path_count,
+            content_count=self.content_count,
+            article_count=self.article_count,
+            folder_count=self.folder_count,
+        )
+
     def assertSubtree(
             self,
             path_count=0,
@@ -293,6 +932,123 @@ class TestDeleteOperation(DatabaseTestCase):
         assert self.s.query(Folder).count() == folder_count
 
 
+@all_databases
+class TestBulkInsertOperation(QueryCountTestCase):
+    def setup(self):
+        super().setup()
+        self.root = get_folder(name='root', slug='root')
+        self.section = get_folder(self.root, name='section', slug='section')
+        self.s.add(self.root)
+        self.s.flush()
+
+        self.fut = BulkInsertOperation(self.s)
+
+    def test_insert(self):
+        ids = self.fut.insert(self.section, [
+            {'name': 'a1', 'slug': 'a1', 'title': 'a1 title'},
+            {'name': 'a2', 'slug': 'a2'},
+        ], Article)
+
+        children = Query(self.s, self.section).children() \
+            .order_by(Content.id).all()
+
+        assert [c.id for c in children] == ids
+        assert children[0].title == 'a1 title'
+        assert isinstance(children[1], Article)
+        assert self.section.child_count == 2
+
+    def test_insert_creates_paths_to_all_ancestors(self):
+        id, = self.fut.insert(self.section, [{'name': 'a1', 'slug': 'a1'}])
+
+        article = self.s.query(Content).get(id)
+
+        assert article.lineage == [self.root, self.section, article]
+        assert article.slugs == ['root', 'section', 'a1']
+        assert article.url_path == 'root/section/a1'
+
+    def test_insert_without_parent_creates_roots(self):
+        ids = self.fut.insert(None, [{'name': 'r', 'slug': 'r'}])
+
+        assert self.s.query(Path).filter_by(descendant=ids[0]).count() == 1
+
+    def test_insert_is_visible_from_parent(self):
+        self.section.ancestor_paths
+        self.fut.insert(self.section, [{'name': 'a1', 'slug': 'a1'}])
+
+        assert len(self.section.ancestor_paths) == 2
+
+    def test_insert_does_not_flush_per_row(self):
+        rows = [{'name': 'a', 'slug': 'a'} for _ in range(10)]
+        with self.count_queries():
+            self.fut.insert(self.section, rows)
+
+        # One insert per content row, two executemany for the paths and one
+        # update of the parent's child count
+        self.assert_query_count_is(13)
+
+    def test_insert_batches_content_type_rows(self):
+        rows = [{'name': 'a', 'slug': 'a', 'title': 't'} for _ in range(9)]
+        rows.append({'name': 'a', 'slug': 'a'})
+        with self.count_queries():
+            ids = self.fut.insert(self.section, rows, Article)
+
+        # The article rows are inserted with one executemany per set of keys
+        self.assert_query_count_is(15)
+        assert self.s.query(Article).get(ids[0]).title == 't'
+
+    def test_insert_batches_content_rows_with_allocated_ids(self):
+        next_id = self.section.id + 100
+
+        def allocate_ids(table, count):
+            return list(range(next_id, next_id + count))
+
+        rows = [{'name': 'a', 'slug': 'a', 'title': 't'} for _ in range(10)]
+        with patch.object(self.fut, '_allocate_ids', allocate_ids):
+            with self.count_queries():
+                ids = self.fut.insert(self.section, rows, Article)
+
+        # One executemany per table, two for the paths and one update of the
+        # parent's child count
+        self.assert_query_count_is(5)
+        assert ids == list(range(next_id, next_id + 10))
+        assert self.section.child_count == 10
+
+    def test_insert_tree(self):
+        ids = self.fut.insert_tree(self.section, [
+            {'name': 'f1', 'slug': 'f1', 'content_type': Folder, 'children': [
+                {'name': 'a1', 'slug': 'a1'},
+                {'name': 'f2', 'slug': 'f2', 'content_type': Folder,
+                 'children': [{'name': 'a2', 'slug': 'a2'}]},
+            ]},
+            {'name': 'a3', 'slug': 'a3'},
+        ], Article)
+
+        f1, a1, f2, a2, a3 = [self.s.query(Content).get(id) for id in ids]
+
+        assert isinstance(f1, Folder)
+        assert isinstance(a2, Article)
+        assert a2.url_path == 'root/section/f1/f2/a2'
+        assert a2.lineage == [self.root, self.section, f1, f2, a2]
+        assert a3.parent == self.section
+        assert f1.child_count == 2
+        assert a1.child_count == 0
+        assert self.section.child_count == 2
+        assert len(Query(self.s, self.section).children().depth(4).all()) \
+            == 5
+
+    def test_insert_tree_returns_ids_depth_first(self):
+        ids = self.fut.insert_tree(self.section, [
+            {'name': 'f1', 'slug': 'f1', 'content_type': Folder, 'children': [
+                {'name': 'a1', 'slug': 'a1'},
+            ]},
+            {'name': 'a2', 'slug': 'a2'},
+        ], Article)
+
+        names = [self.s.query(Content).get(id).name for id in ids]
+
+        assert names == ['f1', 'a1', 'a2']
+
+
 def get_repo_mock(registry=None, session=None, query_extensions=None):
     if not session:
         session = Mock()
@@ -54,6 +54,18 @@ class TestTemplateFilters:
             b='c',
         )
 
+    @patch('yoshimi.templating.paths', autospec=True)
+    def test_paths_filter(self, paths_mock):
+        from yoshimi.templating import paths_filter
+        paths_filter([self.context], 'a', b='c')
+
+        paths_mock.assert_called_once_with(
+            self.request_mock,
+            [self.context],
+            'a',
+            b='c',
+        )
+
     @patch('yoshimi.templating.path', autospec=True)
     def test_path_back_filter(self, path_mock):
         from yoshimi.templating import path_back_filter
@@ -1,9 +1,30 @@
 import pytest
+from datetime import (
+    datetime,
+    timedelta,
+)
 import sqlalchemy
-from tests.yoshimi import DatabaseTestCase
+from sqlalchemy.dialects import (
+    mysql,
+    postgresql,
+    sqlite,
+)
+from tests.yoshimi import (
+    DatabaseTestCase,
+    Mock,
+    QueryCountTestCase,
+    patch,
+)
 from tests.yoshimi.contenttypes import get_content
-from yoshimi.entities import TrashContent
-from yoshimi.trash import Trash
+from yoshimi.content import Content
+from yoshimi.entities import (
+    Counter,
+    TrashContent,
+)
+from yoshimi.trash import (
+    TRASH_COUNTER,
+    Trash,
+)
 
 
 class TestTrashContent:
@@ -14,6 +35,14 @@ class TestTrashContent:
         assert entity.content == c1
         assert c1.trash_info == entity
 
+    def test_created_at_is_indexed(self):
+        indexes = [
+            tuple(c.name for c in index.columns)
+            for index in TrashContent.__table__.indexes
+        ]
+
+        assert ('created_at',) in indexes
+
 
 class TestTrash(DatabaseTestCase):
     def setup(self):
@@ -49,10 +78,72 @@ class TestTrash(DatabaseTestCase):
         assert self.c2.is_trashed is True
         assert self.c3.is_trashed is True
 
+    def test_insert_updates_child_counts(self):
+        self.trash.insert(self.c2)
+
+        assert self.c1.child_count == 0
+        assert self.c2.child_count == 0
+
+    def test_restore_updates_child_counts(self):
+        self.trash.insert(self.c2)
+
+        self.trash.restore(self.c2)
+
+        assert self.c1.child_count == 1
+        assert self.c2.child_count == 1
+
+    def test_restore_without_children_updates_child_counts(self):
+        self.trash.insert(self.c2)
+
+        self.trash.restore(self.c2, with_children=False)
+
+        assert self.c1.child_count == 1
+        assert self.c2.child_count == 0
+
     def test_count(self):
         self.trash.insert(self.c3)
         assert self.trash.count() == 1
 
+    def test_count_is_kept_in_counter(self):
+        self.trash.insert(self.c2)
+        assert self._counter() == 2
+
+        self.trash.restore(self.c3, with_children=False)
+        assert self._counter() == 1
+
+        self.trash.restore(self.c2)
+        assert self._counter() == 0
+        assert self.trash.count() == 0
+
+    def test_count_is_reset_when_emptied(self):
+        self.trash.insert(self.c1)
+        self.trash.empty()
+
+        assert self._counter() == 0
+        assert self.trash.count() == 0
+
+    def test_count_creates_missing_counter(self):
+        self.trash.insert(self.c2)
+        self.s.query(Counter).delete()
+
+        assert self.trash.count() == 2
+        assert self._counter() == 2
+
+    @patch('yoshimi.trash.mark_changed')
+    def test_created_counter_is_committed(self, mark_changed):
+        self.s.query(Counter).delete()
+
+        self.trash.count()
+
+        mark_changed.assert_called_with(self.s)
+
+    def test_recount_fixes_stale_counter(self):
+        self.trash.insert(self.c3)
+        self.s.query(Counter).update({'value': 10})
+
+        assert self.trash.recount() == 1
+        assert self.trash.count() == 1
+
     def test_items(self):
         self.trash.insert(self.c2)
         assert len(self.trash.items().all()) == 2
@@ -92,6 +183,94 @@ class TestTrash(DatabaseTestCase):
         assert self.c1.is_available is True
         assert self._trash_count() == 0
 
+    def test_insert_many(self):
+        sibling = get_content(parent=self.root)
+        self.s.add(sibling)
+        self.s.flush()
+
+        self.trash.insert_many([self.c2, sibling])
+
+        assert self.c2.is_trashed is True
+        assert self.c3.is_trashed is True
+        assert sibling.is_trashed is True
+        assert self.c1.is_available is True
+        assert self.root.child_count == 1
+        assert self.trash.count() == 3
+
+    def test_insert_many_with_overlapping_subtrees(self):
+        self.trash.insert_many([self.c1, self.c2])
+
+        assert self._trash_count() == 3
+        assert self.trash.count() == 3
+
+    def test_restore_many(self):
+        sibling = get_content(parent=self.root)
+        self.s.add(sibling)
+        self.s.flush()
+        self.trash.insert_many([self.c2, sibling])
+
+        self.trash.restore_many([self.c2.id, sibling.id])
+
+        assert self.c2.is_available is True
+        assert self.c3.is_available is True
+        assert sibling.is_available is True
+        assert self.root.child_count == 2
+        assert self.c1.child_count == 1
+        assert self._trash_count() == 0
+        assert self.trash.count() == 0
+
+    def test_restore_many_without_children(self):
+        self.trash.insert(self.c1)
+
+        self.trash.restore_many([self.c1.id, self.c2.id], with_children=False)
+
+        assert self.c1.is_available is True
+        assert self.c2.is_available is True
+        assert self.c3.is_trashed is True
+        assert self.c2.child_count == 0
+        assert self._trash_count() == 1
+        assert self.trash.count() == 1
+
+    def test_restore_many_without_ids(self):
+        self.trash.restore_many([])
+
+    def test_expire(self):
+        self.trash.insert(self.c3)
+        self.trash.insert(self.c1)
+        self.s.query(TrashContent).filter_by(content_id=self.c3.id).update(
+            {'created_at': datetime.utcnow() - timedelta(days=10)},
+            synchronize_session=False
+        )
+
+        expired = self.trash.expire(datetime.utcnow() - timedelta(days=1))
+
+        assert expired == 1
+        assert self.c3.is_pending_deletion is True
+        assert self.c2.is_trashed is True
+        assert self._trash_count() == 2
+        assert self.trash.count() == 2
+
+    def test_expire_oldest_first_with_limit(self):
+        self.trash.insert(self.c1)
+        self.s.query(TrashContent).filter_by(content_id=self.c2.id).update(
+            {'created_at': datetime(2000, 1, 1)},
+            synchronize_session=False
+        )
+
+        assert self.trash.expire(datetime.utcnow(), limit=1) == 1
+        assert self.c2.is_pending_deletion is True
+        assert self.trash.count() == 2
+
+    def test_expire_without_expired_entries(self):
+        self.trash.insert(self.c1)
+
+        assert self.trash.expire(datetime(2000, 1, 1)) == 0
+
+    def _counter(self):
+        return self.s.query(Counter.value).filter_by(
+            name=TRASH_COUNTER
+        ).scalar()
+
     def _trash_count(self):
         return self.s.query(TrashContent).count()
 
@@ -99,3 +278,203 @@ class TestTrash(DatabaseTestCase):
         return self.s.query(TrashContent).filter_by(
             content_id=id
         ).one()
+
+
+class TestTrashItems(QueryCountTestCase):
+    def setup(self):
+        super().setup()
+        self.root = get_content()
+        self.children = [get_content(parent=self.root) for i in range(5)]
+        self.add_object(self.root)
+        self.trash = Trash(self.s)
+        self.trash.insert_many(self.children)
+        self.ids = [child.id for child in self.children]
+        self.root_id = self.root.id
+        # Same timestamp for all items, ties are ordered by content id
+        self.s.query(TrashContent).update(
+            {'created_at': datetime(2013, 1, 1)}, synchronize_session=False
+        )
+        self.s.expunge_all()
+
+    def test_items_loads_parent_id_and_status(self):
+        with self.count_queries():
+            items = self.trash.items().all()
+            for item in items:
+                item.content.name
+                item.parent_status_id
+
+        assert len(items) == 5
+        assert set(item.parent_id for item in items) == set([self.root_id])
+        assert set(item.parent_status_id for item in items) == set(
+            [Content.status.AVAILABLE]
+        )
+        self.assert_query_count_is(1)
+
+    def test_items_without_parent(self):
+        self.trash.insert(self.s.query(Content).get(self.root_id))
+
+        item = self.trash.items().filter(
+            TrashContent.content_id == self.root_id
+        ).one()
+
+        assert item.parent_id is None
+        assert item.parent_status_id is None
+
+    def test_items_with_trashed_parent(self):
+        self.s.query(Content).filter_by(id=self.root_id).update(
+            {'status_id': Content.status.TRASHED}, synchronize_session=False
+        )
+
+        items = self.trash.items().all()
+
+        assert items[0].parent_status_id == Content.status.TRASHED
+
+    def test_keyset_pagination(self):
+        first = self.trash.items().paginate_after(None, per_page=2)
+        second = self.trash.items().paginate_after(
+            first.next_cursor, per_page=2
+        )
+        last = self.trash.items().paginate_after(
+            second.next_cursor, per_page=2
+        )
+
+        ids = sorted(self.ids, reverse=True)
+        assert [item.content_id for item in first.items] == ids[:2]
+        assert [item.content_id for item in second.items] == ids[2:4]
+        assert [item.content_id for item in last.items] == ids[4:]
+        assert last.has_next is False
+        assert second.items[0].parent_id == self.root_id
+
+    def test_items_are_newest_first(self):
+        self.s.query(TrashContent).filter_by(content_id=self.ids[0]).update(
+            {'created_at': datetime(2014, 1, 1)}, synchronize_session=False
+        )
+
+        items = self.trash.items().all()
+
+        assert items[0].content_id == self.ids[0]
+
+
+class TestTrashRestoreMany(QueryCountTestCase):
+    def test_query_count_does_not_depend_on_number_of_items(self):
+        root = get_content()
+        items = [get_content(parent=root) for i in range(10)]
+        self.add_object(root)
+        ids = [item.id for item in items]
+        trash = Trash(self.s)
+        trash.insert_many(items)
+
+        with self.count_queries():
+            trash.restore_many(ids[:1])
+        expected = len(self.statements)
+
+        trash.insert_many(items)
+        with self.count_queries():
+            trash.restore_many(ids)
+
+        self.assert_query_count_is(expected)
+
+
+class TestTrashSubtreeStatements:
+    def _statements(self, dialect):
+        session = Mock()
+        session.bind.dialect.name = dialect.name
+        trash = Trash(session)
+        trash._set_content_status([1], 10, 0)
+        trash._delete_trash_entries([1])
+        trash._insert_trash_entities([1])
+
+        return [
+            ' '.join(str(call[0][0].compile(dialect=dialect)).split())
+            for call in session.execute.call_args_list
+        ]
+
+    def test_postgresql_joins_path(self):
+        update, delete, insert = self._statements(postgresql.dialect())
+
+        assert update.startswith(
+            'UPDATE content SET status_id=%(status_id)s FROM path '
+            'WHERE path.descendant = content.id'
+        )
+        assert delete.startswith('DELETE FROM trash USING path WHERE '
+                                 'path.descendant = trash.content_id')
+        assert 'content.id IN (SELECT path.descendant' in insert
+
+    def test_mysql_uses_multi_table_statements(self):
+        update, delete, insert = self._statements(mysql.dialect())
+
+        assert update.startswith('UPDATE content, path SET')
+        assert delete.startswith('DELETE FROM trash USING trash, path')
+        assert 'content.id IN (SELECT path.descendant' in insert
+
+    def test_sqlite_uses_subquery_without_or(self):
+        for statement in self._statements(sqlite.dialect()):
+            assert 'IN (SELECT path.descendant FROM path' in statement
+            assert ' OR ' not in statement
+
+
+class TestTrashExpiry(QueryCountTestCase):
+    def setup(self):
+        super().setup()
+        self.root = get_content()
+        self.parent = get_content(parent=self.root)
+        self.child = get_content(parent=self.parent)
+        self.grandchild = get_content(parent=self.child)
+        self.other = get_content(parent=self.root)
+        self.s.add(self.root)
+        self.s.flush()
+        self.trash = Trash(self.s)
+
+    def _assert_unrelated_not_reloaded(self):
+        with self.count_queries():
+            self.root.name
+            self.root.child_count
+            self.other.name
+            self.other.status_id
+        self.assert_query_count_is(0)
+
+    def test_insert(self):
+        self.trash.insert(self.child)
+
+        self._assert_unrelated_not_reloaded()
+        assert self.parent.child_count == 0
+        assert self.grandchild.is_trashed is True
+
+    def test_restore(self):
+        self.trash.insert(self.child)
+        self.parent.child_count
+
+        self.trash.restore(self.child)
+
+        self._assert_unrelated_not_reloaded()
+        assert self.parent.child_count == 1
+        assert self.grandchild.is_available is True
+
+    def test_restore_without_children(self):
+        self.trash.insert(self.child)
+
+        self.trash.restore(self.child, with_children=False)
+
+        self._assert_unrelated_not_reloaded()
+        assert self.parent.child_count == 1
+        assert self.grandchild.is_trashed is True
+
+    def test_empty(self):
+        self.trash.insert(self.child)
+        self.grandchild.status_id
+        trash_info = self.child.trash_info
+
+        self.trash.empty()
+
+        self._assert_unrelated_not_reloaded()
+        assert self.grandchild.is_pending_deletion is True
+        assert 'created_at' not in trash_info.__dict__
+
+    def test_permanently_empty(self):
+        self.trash.insert(self.child, soft=False)
+        self.grandchild.status_id
+
+        self.trash.permanently_empty()
+
+        self._assert_unrelated_not_reloaded()
+        assert 'status_id' not in self.grandchild.__dict__
@@ -66,6 +66,32 @@ class TestUrl(_PathFunctionBase):
         self.req.resource_url.assert_called_with(*args, **kw)
 
 
+class TestPaths:
+    def setup(self):
+        from yoshimi.url import paths
+        self.fut = paths
+        self.req = Mock()
+        self.req.matched_route.name = 'route_name'
+        self.req.resource_path.side_effect = lambda c, **kw: c.url_path
+
+    @patch('yoshimi.url.load_lineages', autospec=True)
+    def test_returns_paths_in_order(self, load_lineages):
+        c1 = Mock(url_path='a')
+        c2 = Mock(url_path='b')
+
+        assert self.fut(self.req, iter([c1, c2])) == ['a', 'b']
+
+    @patch('yoshimi.url.load_lineages', autospec=True)
+    def test_loads_lineages_of_content_without_url_path(self, load_lineages):
+        c1 = Mock(url_path='a')
+        c2 = Mock(url_path=None)
+
+        self.fut(self.req, [c1, c2], route='testroute')
+
+        load_lineages.assert_called_once_with([c2])
+        self.req.resource_path.assert_called_with(c2, route_name='testroute')
+
+
 class TestBackToContextUrl:
     def setup(self):
         from yoshimi.url import back_to_context_url
@@ -202,6 +228,7 @@ class TestResourceUrlAdapter:
         loc3.lineage = [loc1, loc2, loc3]
         loc3.id = 1
         loc3.slugs = ['a', 'b', 'c']
+        loc3.url_path = None
 
         request = DummyRequest()
         ResourceUrlAdapter(loc3, request)
@@ -213,6 +240,97 @@ class TestResourceUrlAdapter:
         assert loc3.__parent__ is not None
         assert loc3.__name__ is not None
 
+    def test_path_from_lineage(self):
+        from yoshimi.url import ResourceUrlAdapter
+
+        loc1 = MagicMock()
+        loc2 = MagicMock()
+        loc2.lineage = [loc1, loc2]
+        loc2.id = 1
+        loc2.slugs = ['a', 'b']
+        loc2.url_path = None
+
+        adapter = ResourceUrlAdapter(loc2, DummyRequest())
+
+        assert adapter.physical_path == 'a/b-1/'
+
+    def test_path_from_url_path_does_not_load_lineage(self):
+        from yoshimi.url import ResourceUrlAdapter
+
+        content = Mock(spec=['id', 'url_path'])
+        content.id = 1
+        content.url_path = 'a/b'
+
+        adapter = ResourceUrlAdapter(content, DummyRequest())
+
+        assert adapter.physical_path == 'a/b-1/'
+        assert adapter.physical_path_tuple == ('a', 'b-1', '')
+
+
+class TestResourceUrlAdapterCache:
+    def setup(self):
+        from yoshimi.cache import set_region, LRUCache
+        from yoshimi.url import ResourceUrlAdapter
+        self.cache = LRUCache()
+        set_region('urls', self.cache)
+        self.fut = ResourceUrlAdapter
+
+        self.content = Mock(spec=['id', 'url_path'])
+        self.content.id = 1
+        self.content.url_path = 'a/b'
+
+    def teardown(self):
+        from yoshimi.cache import set_region
+        set_region('urls', None)
+
+    def test_path_is_cached_by_content_id(self):
+        self.fut(self.content, DummyRequest())
+        paths = self.cache.get(1)
+        paths[(None, 'a/b')] = ('x/', 'x/', ('x', ''), ('x', ''))
+
+        adapter = self.fut(self.content, DummyRequest())
+
+        assert adapter.physical_path == 'x/'
+        assert adapter.virtual_path_tuple == ('x', '')
+
+    def test_changed_url_path_misses_stale_path(self):
+        self.fut(self.content, DummyRequest())
+        self.content.url_path = 'c/d'
+
+        adapter = self.fut(self.content, DummyRequest())
+
+        assert adapter.physical_path == 'c/d-1/'
+        assert adapter.virtual_path_tuple == ('c', 'd-1', '')
+
+    def test_path_is_cached_per_virtual_root(self):
+        self.fut(self.content, DummyRequest())
+        request = DummyRequest(environ={'HTTP_X_VHM_ROOT': '/a'})
+
+        adapter = self.fut(self.content, request)
+
+        assert adapter.physical_path == 'a/b-1/'
+        assert adapter.virtual_path == 'a/b-1/'
+        assert len(self.cache.get(1)) == 2
+
+    def test_content_without_id_is_not_cached(self):
+        self.content.id = None
+
+        self.fut(self.content, DummyRequest())
+
+        assert len(self.cache) == 0
+
+    def test_content_without_url_path_is_not_cached(self):
+        content = MagicMock()
+        content.lineage = [content]
+        content.id = 1
+        content.slugs = ['a']
+        content.url_path = None
+
+        adapter = self.fut(content, DummyRequest())
+
+        assert adapter.physical_path == 'a-1/'
+        assert len(self.cache) == 0
+
 
 class TestRootFactory:
     def setup_class(cls):
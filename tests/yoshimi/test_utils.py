@@ -29,6 +29,15 @@ class TestLazyPaginator:
         query.paginate.assert_called_with(4)
         assert total == 30
 
+    def test_calls_paginate_after_without_page(self):
+        query = Mock()
+        query.configure_mock(**{'paginate_after.return_value.has_next': True})
+
+        has_next = LazyPagination(query, cursor='abc').has_next
+
+        query.paginate_after.assert_called_with('abc')
+        assert has_next is True
+
 
 class TestProxy:
     def test_calls_original_method(self):
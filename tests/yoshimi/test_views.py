@@ -2,15 +2,22 @@ from pyramid import testing
 from pyramid.httpexceptions import HTTPFound
 from webob.multidict import MultiDict
 from yoshimi.auth import AuthCoordinator
+from yoshimi.content import Content
 from yoshimi.forms import BaseForm
 from yoshimi.forms import ContentMoveForm
+from yoshimi.trash import Trash
 from yoshimi.views import login
 from yoshimi.views import logout
 from yoshimi.views import move
 from tests.yoshimi import (
+    QueryCountTestCase,
     Mock,
     patch,
 )
+from tests.yoshimi.contenttypes import (
+    get_article,
+    get_folder,
+)
 
 
 class TestDeleteView:
@@ -128,3 +135,106 @@ class TestWrapView:
         assert 'view1' in rv
         assert 'view2' in rv
         assert 'view3' in rv
+
+
+class TestTreeView(QueryCountTestCase):
+    def setup(self):
+        super().setup()
+        # - root
+        # - - f1
+        # - - - f2
+        # - - - - a1
+        # - - a2
+        self.root = get_folder(name='root')
+        self.f1 = get_folder(self.root, name='f1')
+        self.f2 = get_folder(self.f1, name='f2')
+        self.a1 = get_article(self.f2, name='a1')
+        self.a2 = get_article(self.root, name='a2')
+        self.s.add(self.root)
+        self.s.flush()
+        self.s.expire_all()
+
+        self.request = testing.DummyRequest()
+        self.request.y_db = self.s
+        self.request.y_paths = lambda contents: ['/url' for c in contents]
+
+        from yoshimi.views import tree
+        self.fut = tree
+
+    def _ids(self, nodes):
+        return [node['id'] for node in nodes]
+
+    def test_returns_children_in_one_query(self):
+        root = self.s.query(Content).get(self.root.id)
+
+        with self.count_queries():
+            rv = self.fut(root, self.request)
+
+        self.assert_query_count_is(1)
+        assert self._ids(rv) == [self.f1.id, self.a2.id]
+        assert rv[0]['label'] == 'f1'
+        assert rv[0]['url'] == '/url'
+
+    def test_loads_lineages_for_urls_in_one_query(self):
+        from functools import partial
+        from yoshimi.url import paths
+        self.s.execute('UPDATE content SET url_path = NULL')
+        self.request.matched_route = Mock()
+        self.request.resource_path = lambda content, **kw: '/'.join(
+            c.name for c in content.lineage
+        )
+        self.request.y_paths = partial(paths, self.request)
+        root = self.s.query(Content).get(self.root.id)
+
+        with self.count_queries():
+            rv = self.fut(root, self.request)
+            urls = [node['url'] for node in rv]
+
+        self.assert_query_count_is(2)
+        assert urls == ['root/f1', 'root/a2']
+
+    def test_flags_nodes_with_children_to_load_on_demand(self):
+        rv = self.fut(self.root, self.request)
+
+        assert rv[0]['has_children'] is True
+        assert rv[0]['load_on_demand'] is True
+        assert rv[0]['children'] == []
+        assert rv[1]['has_children'] is False
+        assert rv[1]['load_on_demand'] is False
+
+    def test_prefetches_depth(self):
+        self.request.GET['depth'] = '2'
+
+        rv = self.fut(self.root, self.request)
+
+        f1 = rv[0]
+        assert f1['load_on_demand'] is False
+        assert self._ids(f1['children']) == [self.f2.id]
+        assert f1['children'][0]['load_on_demand'] is True
+
+    def test_skips_content_below_unavailable_parent(self):
+        self.request.GET['depth'] = '3'
+        trash = Trash(self.s)
+        trash.insert(self.f2)
+        trash.restore(self.a1, with_children=False)
+
+        rv = self.fut(self.root, self.request)
+
+        assert self._ids(rv[0]['children']) == []
+        assert rv[0]['load_on_demand'] is False
+
+    def test_depth_is_capped(self):
+        self.request.GET['depth'] = '100'
+
+        rv = self.fut(self.root, self.request)
+
+        f2 = rv[0]['children'][0]
+        assert self._ids(f2['children']) == [self.a1.id]
+
+    def test_excludes_unavailable_children(self):
+        self.a2.status_id = Content.status.TRASHED
+        self.s.flush()
+
+        rv = self.fut(self.root, self.request)
+
+        assert self._ids(rv) == [self.f1.id]
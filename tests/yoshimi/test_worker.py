@@ -0,0 +1,178 @@
+import pytest
+from datetime import (
+    datetime,
+    timedelta,
+)
+from tests.yoshimi import (
+    DatabaseTestCase,
+    Mock,
+)
+from tests.yoshimi.contenttypes import (
+    get_article,
+    get_folder,
+)
+from yoshimi.content import (
+    Content,
+    Path,
+)
+from yoshimi.entities import TrashContent
+from yoshimi.trash import Trash
+from yoshimi.worker import DeletionWorker
+
+
+class TestDeletionWorker(DatabaseTestCase):
+    def setup(self):
+        super().setup()
+        # - root
+        # - - f1 (pending deletion)
+        # - - - a1
+        # - - - a2
+        # - - a3
+        self.root = get_folder(name='root')
+        self.f1 = get_folder(self.root, name='f1')
+        self.a1 = get_article(self.f1, name='a1')
+        self.a2 = get_article(self.f1, name='a2')
+        self.a3 = get_article(self.root, name='a3')
+        self.s.add(self.root)
+        self.s.flush()
+        self.ids = dict(
+            (c.name, c.id) for c in (self.root, self.f1, self.a1, self.a2)
+        )
+        Trash(self.s).insert(self.f1, soft=False)
+        self.sleeper = Mock()
+
+    def _worker(self, **kwargs):
+        return DeletionWorker(self.s, sleeper=self.sleeper, **kwargs)
+
+    def _remaining(self):
+        return set(id for id, in self.s.query(Content.id))
+
+    def test_deletes_children_first(self):
+        deleted = self._worker(batch_size=2).run_batch()
+
+        assert deleted == [self.ids['a1'], self.ids['a2']]
+        assert self.ids['f1'] in self._remaining()
+
+    def test_run_deletes_everything_pending(self):
+        progress = Mock()
+
+        deleted = self._worker(batch_size=2).run(progress=progress)
+
+        assert deleted == 3
+        assert self._remaining() == set([self.root.id, self.a3.id])
+        progress.assert_called_with(3, 0)
+        assert self.s.query(Path).filter(
+            Path.descendant == self.ids['a1']
+        ).count() == 0
+
+    def test_max_batches(self):
+        worker = self._worker(batch_size=1)
+
+        assert worker.run(max_batches=2) == 2
+        assert worker.pending() == 1
+
+    def test_sleeps_between_batches(self):
+        self._worker(batch_size=1, sleep=0.5).run()
+
+        assert self.sleeper.call_count == 2
+        self.sleeper.assert_called_with(0.5)
+
+    def test_hooks_are_called_per_batch(self):
+        hook = Mock()
+
+        self._worker(batch_size=2, hooks=[hook]).run()
+
+        assert hook.call_count == 2
+        hook.assert_called_with(self.s, [self.ids['f1']])
+
+    def test_failing_hook_rolls_back_batch(self):
+        hook = Mock(side_effect=IOError)
+        worker = self._worker(hooks=[hook])
+
+        with pytest.raises(IOError):
+            worker.run_batch()
+
+    def test_skips_pending_content_with_children_left(self):
+        self.s.query(Content).filter(
+            Content.id.in_([self.ids['a1'], self.ids['a2']])
+        ).update(
+            {Content.status_id: Content.status.AVAILABLE},
+            synchronize_session=False
+        )
+
+        deleted = self._worker().run()
+
+        assert deleted == 0
+        assert self.ids['f1'] in self._remaining()
+
+    def test_keeps_trashed_children_of_pending_content_restorable(self):
+        trash = Trash(self.s)
+        a3_id = self.a3.id
+        self.s.query(Content).update(
+            {Content.status_id: Content.status.AVAILABLE},
+            synchronize_session=False
+        )
+        trash.insert(self.a1)
+        trash.insert(self.f1, soft=False)
+
+        deleted = self._worker().run()
+
+        assert deleted == 1
+        assert self._remaining() == set(
+            [self.root.id, self.ids['f1'], self.ids['a1'], a3_id]
+        )
+        paths = set(self.s.query(Path.ancestor, Path.length).filter(
+            Path.descendant == self.ids['a1']
+        ))
+        assert paths == set([
+            (self.ids['a1'], 0), (self.ids['f1'], 1), (self.root.id, 2)
+        ])
+
+    def test_nothing_to_delete(self):
+        self._worker().run()
+
+        assert self._worker().run() == 0
+
+    def test_expires_trash_before_deleting(self):
+        Trash(self.s).insert(self.a3)
+        self._age_trash(days=31)
+
+        deleted = self._worker(retention=timedelta(days=30)).run()
+
+        assert deleted == 4
+        assert self._remaining() == set([self.root.id])
+        assert Trash(self.s).count() == 0
+
+    def test_expire_trash_keeps_recent_entries(self):
+        Trash(self.s).insert(self.a3)
+        self._age_trash(days=29)
+
+        expired = self._worker(retention=timedelta(days=30)).expire_trash()
+
+        assert expired == 0
+        assert Trash(self.s).count() == 1
+
+    def test_expire_trash_in_chunks(self):
+        Trash(self.s).insert(self.root)
+        self._age_trash(days=31)
+        worker = self._worker(
+            batch_size=1, sleep=0.5, retention=timedelta(days=30)
+        )
+
+        assert worker.expire_trash() == 2
+        assert self.sleeper.call_count == 2
+        assert self.s.query(Content).filter_by(
+            status_id=Content.status.PENDING_DELETION
+        ).count() == 5
+
+    def test_expire_trash_without_retention(self):
+        Trash(self.s).insert(self.a3)
+        self._age_trash(days=1000)
+
+        assert self._worker().expire_trash() == 0
+
+    def _age_trash(self, days):
+        self.s.query(TrashContent).update(
+            {'created_at': datetime.utcnow() - timedelta(days=days)},
+            synchronize_session=False
+        )
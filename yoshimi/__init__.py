@@ -2,6 +2,7 @@ from functools import partial
 import pyramid_jinja2
 import pyramid_jinja2.filters
 from yoshimi import auth
+from yoshimi.cache import setup_cache
 from yoshimi.db import get_db
 from yoshimi.content import Content
 from yoshimi.config import add_query_directive
@@ -10,11 +11,13 @@ from yoshimi.repo import content_getter
 from yoshimi.templating import (
     url_filter,
     path_filter,
+    paths_filter,
     path_back_filter,
 )
 from yoshimi.url import (
     url as url_func,  # done to prevent conflicts with url module
     path,
+    paths,
     back_to_context_url,
     ResourceUrlAdapter,
     RootFactory
@@ -23,6 +26,7 @@ from yoshimi.url import (
 
 def includeme(config):
     auth.register_auth(config)
+    setup_cache(config.get_settings())
 
     setup_template(config)
 
@@ -35,6 +39,7 @@ def includeme(config):
     config.add_request_method(get_db, name='y_db', reify=True)
     config.add_request_method(repo_maker, name='y_repo', reify=True)
     config.add_request_method(path, name='y_path', reify=False)
+    config.add_request_method(paths, name='y_paths', reify=False)
     config.add_request_method(url_func, name='y_url', reify=False)
     config.add_request_method(
         back_to_context_url, name='y_back_to_context_url', reify=False
@@ -47,6 +52,7 @@ def setup_template(config):
     config.get_jinja2_environment().filters.update({
         'y_url': url_filter,
         'y_path': path_filter,
+        'y_paths': paths_filter,
         'y_path_back': path_back_filter,
         'model_url': pyramid_jinja2.filters.model_url_filter,
         'route_url': pyramid_jinja2.filters.route_url_filter,
@@ -4,7 +4,8 @@ from yoshimi.views import (
     logout,
     browse,
     delete,
-    move
+    move,
+    tree,
 )
 from yoshimi.admin.views import (
     index,
@@ -65,6 +66,9 @@ def include_views(config):
     config.add_view(
         move, route_name='y_admin', name='move', renderer='json'
     )
+    config.add_view(
+        tree, route_name='y_admin', name='tree.json', renderer='json'
+    )
     config.add_view(
         index, route_name='y_admin', renderer='admin/index.jinja2'
     )
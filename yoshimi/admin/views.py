@@ -1,7 +1,7 @@
 from yoshimi import views
+from yoshimi.content import Content
 from yoshimi.utils import (
     run_once,
-    page_number,
     LazyPagination,
 )
 from yoshimi.url import redirect_back
@@ -20,13 +20,11 @@ def index(context, request):
 @views.merge(*layout_views)
 def trash_index(_, request):
     def can_select(trash_content):
-        if not trash_content.content.parent:
-            return False
-        return trash_content.content.parent.is_available
+        return trash_content.parent_status_id == Content.status.AVAILABLE
 
     trash_contents = LazyPagination(
         request.y_repo.trash.items(),
-        page_number(request.GET.get('page', 1))
+        cursor=request.GET.get('cursor')
     )
 
     return {
@@ -43,8 +41,10 @@ def trash_empty(request):
 
 
 def trash_restore(request):
-    ids = request.POST.getall('trash_item_id')
-    request.y_repo.trash.restore(ids)
+    ids = [
+        int(id) for id in request.POST.getall('trash_item_id') if id.isdigit()
+    ]
+    request.y_repo.trash.restore_many(ids)
     return redirect_back(
         request, fallback=request.route_url('y.admin.trash.index')
     )
@@ -0,0 +1,152 @@
+"""
+    yoshimi.cache
+    ~~~~~~~~~~~~~
+
+    Implements simple caches used to avoid repeating expensive queries.
+
+    Caches are configured as named regions, normally from the application's
+    settings via :func:`setup_cache`::
+
+        yoshimi.cache.totals = true
+        yoshimi.cache.totals.maxsize = 10000
+        yoshimi.cache.totals.ttl = 300
+        yoshimi.cache.content = true
+        yoshimi.cache.content.ttl = 60
+
+    A region can also be set to any object implementing
+    :class:`~yoshimi.interfaces.ICache` (e.g one backed by a shared store)
+    with :func:`set_region`.
+
+    Cached entries are invalidated when content changes, but only in the
+    process making the change. Other processes (e.g other workers serving
+    the same site) keep their entries until they expire, which is why every
+    region has a finite time to live by default, see :data:`DEFAULT_TTLS`.
+    Lower it if stale data for that long isn't acceptable, or use a shared
+    cache.
+
+    :copyright: (c) 2013 by Ole Morten Halvorsen
+    :license: BSD, see LICENSE for more details.
+"""
+import threading
+import time
+from collections import OrderedDict
+from pyramid.settings import asbool
+from zope.interface import implementer
+from yoshimi.interfaces import ICache
+
+
+#: Names of the regions that can be configured with :func:`setup_cache`
+REGIONS = ('totals', 'content', 'urls')
+
+#: Seconds entries are kept in each region unless ``ttl`` is configured
+DEFAULT_TTLS = {
+    'totals': 300,
+    'content': 60,
+    'urls': 300,
+}
+
+_regions = {}
+
+
+@implementer(ICache)
+class LRUCache:
+    """ In-process cache that evicts the least recently used entries
+
+    :param int maxsize: Maximum number of entries to keep
+    :param float ttl: Number of seconds an entry is valid for. None means
+     entries never expire.
+    :param callable timer: Returns the current time in seconds
+    """
+    def __init__(self, maxsize=1000, ttl=None, timer=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                return default
+
+            if expires is not None and expires <= self._timer():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires = self._timer() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def get_region(name):
+    """ Returns the cache configured for region `name`
+
+    :param str name: Name of the region
+    :return: An :class:`~yoshimi.interfaces.ICache` or None if the region is
+     not configured (i.e caching is disabled)
+    """
+    return _regions.get(name)
+
+
+def set_region(name, cache):
+    """ Configures the cache for region `name`
+
+    :param str name: Name of the region
+    :param cache: An :class:`~yoshimi.interfaces.ICache` or None to disable
+     caching for the region
+    """
+    if cache is None:
+        _regions.pop(name, None)
+    else:
+        _regions[name] = cache
+
+
+def setup_cache(settings):
+    """ Configures the cache regions enabled in `settings`
+
+    Each region in :data:`REGIONS` is enabled with
+    ``yoshimi.cache.<region> = true`` and uses an :class:`LRUCache`. The
+    size and time to live (in seconds) are set with
+    ``yoshimi.cache.<region>.maxsize`` and ``yoshimi.cache.<region>.ttl``.
+    The time to live defaults to :data:`DEFAULT_TTLS`. Set it to ``none`` to
+    never expire entries, which is only safe with a single process.
+
+    :param dict settings: Application settings
+    """
+    for name in REGIONS:
+        prefix = 'yoshimi.cache.%s' % name
+        if not asbool(settings.get(prefix, False)):
+            continue
+
+        ttl = settings.get(prefix + '.ttl', DEFAULT_TTLS[name])
+        if str(ttl).lower() == 'none':
+            ttl = None
+        set_region(name, LRUCache(
+            maxsize=int(settings.get(prefix + '.maxsize', 1000)),
+            ttl=float(ttl) if ttl is not None else None,
+        ))
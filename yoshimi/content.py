@@ -2,14 +2,27 @@ from collections import namedtuple
 from sqlalchemy import (
     Column,
     ForeignKey,
+    Index,
     Integer,
     String,
+    and_,
+    event,
+    exists,
+    func,
+    inspect,
+    literal,
+    select,
 )
 from sqlalchemy.orm import (
+    attributes,
     backref,
+    joinedload,
+    object_session,
     relationship,
+    Session,
 )
 from sqlalchemy.ext import declarative
+from yoshimi.cache import get_region
 from yoshimi.entities import Base
 
 
@@ -18,6 +31,13 @@ class Path(Base):
 
     A Closure Table is used to maintain the tree structure in the database.
     """
+    __table_args__ = (
+        # Lookups of a content's paths (e.g its parent) and of the children
+        # a number of levels below an ancestor.
+        Index('ix_path_descendant_length', 'descendant', 'length'),
+        Index('ix_path_ancestor_length', 'ancestor', 'length'),
+    )
+
     ancestor = Column(
         Integer,
         ForeignKey('content.id', ondelete='CASCADE'),
@@ -77,16 +97,28 @@ class Content(Base):
     id = Column(Integer, primary_key=True)
     creator_id = Column(Integer, ForeignKey('content.id'))
     name = Column(String(1024), nullable=False)
-    # @TODO index on type, used by children query.
-    type = Column(String(50), nullable=False)
+    type = Column(String(50), nullable=False, index=True)
     slug = Column(String(250), nullable=False)
     status_id = Column(Integer, default=0)
+    #: The slugs of the lineage joined by "/". Denormalized from the closure
+    #: table so URLs can be generated without loading the lineage. Content
+    #: created before this column existed has it set to None.
+    url_path = Column(String(2048))
+    #: Number of direct children that are available. Maintained when content
+    #: is created, moved, trashed, restored or deleted.
+    child_count = Column(Integer, nullable=False, default=0)
     own_content = relationship(
         'Content',
         backref=backref('creator', remote_side=[id])
     )
     paths = relationship(Path, foreign_keys=[Path.descendant])
 
+    #: Paths sorted from the root and down, computed once from `paths`. It is
+    #: reset when `paths` changes or is expired.
+    _sorted_paths_cache = None
+    _lineage_cache = None
+    _child_count_increment = 0
+
     def __init__(self, parent=None, **kwargs):
         """
         :param string name: The content's name
@@ -114,9 +146,16 @@ class Content(Base):
                     )
                 )
 
+        if self.slug is not None:
+            self.url_path = join_url_path(parent, self.slug)
+
+        if parent is not None and self.status_id in (
+                None, self.status.AVAILABLE):
+            parent._increment_child_count()
+
     @property
     def slugs(self):
-        return [p.ancestor_content.slug for p in self._sorted_paths()]
+        return [content.slug for content in self._lineage()]
 
     @property
     def parent(self):
@@ -128,16 +167,18 @@ class Content(Base):
         :rtype: A :class:`.Content` or None
         """
         try:
-            return self._sorted_paths()[-2].ancestor_content
+            return self._lineage()[-2]
         except IndexError:
             return None
 
     @property
     def lineage(self):
-        try:
-            return [p.ancestor_content for p in self._sorted_paths()]
-        except IndexError:
-            return None
+        return list(self._lineage())
+
+    @property
+    def has_children(self):
+        """True if the content has any available children"""
+        return bool(self.child_count)
 
     @property
     def is_available(self):
@@ -152,11 +193,451 @@ class Content(Base):
         return self.status_id == self.status.PENDING_DELETION
 
     def _sorted_paths(self):
-        self._sort_paths()
-        return self.paths
+        if self._sorted_paths_cache is None:
+            self._sorted_paths_cache = sorted(
+                self.paths, key=lambda path: path.length, reverse=True
+            )
+        return self._sorted_paths_cache
+
+    def _lineage(self):
+        if self._lineage_cache is None:
+            self._lineage_cache = tuple(
+                p.ancestor_content for p in self._sorted_paths()
+            )
+        return self._lineage_cache
+
+    def _increment_child_count(self):
+        if inspect(self).has_identity:
+            # The database does the increment when flushing, see
+            # _flush_child_count_increments
+            self._child_count_increment += 1
+        self.child_count = (self.child_count or 0) + 1
+
+    def _reset_lineage(self):
+        self._sorted_paths_cache = None
+        self._lineage_cache = None
+
+
+# Defined outside the class as subclasses would otherwise inherit them through
+# __table_args__
+Index('ix_content_status_id_type', Content.status_id, Content.type)
+# Partial index only covering available content so trashed content doesn't
+# bloat the index used by the live site. Ignored by databases without
+# partial indexes (e.g MySQL) where ix_content_status_id_type is used instead.
+_available = Content.status_id == Content.status.AVAILABLE
+Index(
+    'ix_content_available_type', Content.type, Content.id,
+    postgresql_where=_available,
+    sqlite_where=_available,
+)
+
+
+def join_url_path(parent, slug):
+    """Returns the url path for content with `slug` placed below `parent`
+
+    :param parent: Parent content or None for top-level content
+    :param str slug: Slug of the content
+    :return: The url path or None if the parent's url path is unknown
+    """
+    if parent is None:
+        return slug
+    if parent.url_path is None:
+        return None
+    return parent.url_path + '/' + slug
+
+
+def load_lineages(contents):
+    """Loads the lineage of all `contents` that haven't got it loaded yet
+    with one query.
+
+    This is the batch equivalent of eager loading with
+    :meth:`yoshimi.repo.Query.load_path` for content that is already loaded.
+
+    :param contents: Persistent :class:`Content` objects from the same
+     session
+    """
+    missing = dict(
+        (content.id, content) for content in contents
+        if 'paths' not in inspect(content).dict and
+        inspect(content).has_identity
+    )
+    if not missing:
+        return
+
+    session = object_session(next(iter(missing.values())))
+    paths = dict((id, []) for id in missing)
+    query = session.query(Path).options(
+        joinedload(Path.ancestor_content, innerjoin=True)
+    ).filter(Path.descendant.in_(paths))
+    for path in query:
+        paths[path.descendant].append(path)
+
+    for id, content in missing.items():
+        attributes.set_committed_value(content, 'paths', paths[id])
+        content._reset_lineage()
+
+
+def replace_url_paths(connection, subject_id, old, new, include_self=True):
+    """Replaces the url path prefix of `subject_id`'s subtree
+
+    One set based UPDATE joined through the closure table is issued. If `old`
+    or `new` is None the url paths of the subtree are cleared. The cached
+    URLs of the whole subtree are invalidated, see
+    :class:`yoshimi.url.ResourceUrlAdapter`.
+
+    :param connection: Connection or session to execute the UPDATE on
+    :param int subject_id: Id of the top of the subtree
+    :param str old: Url path of the subject before the change
+    :param str new: Url path of the subject after the change
+    :param bool include_self: Whether to update the subject itself or only
+     its descendants
+    """
+    table = Content.__table__
+    if old is None or new is None:
+        value = None
+    else:
+        value = literal(new, String) + func.substr(
+            table.c.url_path, len(old) + 1
+        )
+
+    subtree = select([Path.descendant]).where(Path.ancestor == subject_id)
+    invalidate_urls(connection, subject_id)
+
+    if not include_self:
+        subtree = subtree.where(Path.length > 0)
+
+    connection.execute(
+        table.update().where(table.c.id.in_(subtree)).values(url_path=value)
+    )
+
+
+def invalidate_urls(connection, subject_id):
+    """Removes the cached URLs of `subject_id`'s subtree, see
+    :class:`yoshimi.url.ResourceUrlAdapter`.
+
+    :param connection: Connection or session to look up the subtree with
+    :param int subject_id: Id of the top of the subtree
+    """
+    cache = get_region('urls')
+    if cache is not None:
+        cache.delete_many(id for id, in connection.execute(
+            select([Path.descendant]).where(Path.ancestor == subject_id)
+        ))
+
+
+def update_child_counts(session, ids=None):
+    """Recomputes :attr:`Content.child_count` from the closure table
+
+    The counts are updated with one set based statement counting the `path`
+    rows with `length = 1` pointing to available content.
+
+    :param session: SQLAlchemy session
+    :param ids: Ids of the content to update. Either a list or a select
+     returning ids. If None all content is updated.
+    """
+    table = Content.__table__
+    child = table.alias('child')
+
+    if session.bind.dialect.name == "mysql":
+        # MySQL can't update a table it selects from in a subquery so count
+        # in a derived table instead. Every content has a path to itself so
+        # all content is included in the counts.
+        counts = select([
+            Path.ancestor.label('id'),
+            func.count(child.c.id).label('child_count'),
+        ]).select_from(
+            Path.__table__.outerjoin(child, and_(
+                child.c.id == Path.descendant,
+                Path.length == 1,
+                child.c.status_id == Content.status.AVAILABLE,
+            ))
+        ).group_by(Path.ancestor)
+        if ids is not None:
+            counts = counts.where(Path.ancestor.in_(ids))
+        counts = counts.alias('counts')
+
+        stmt = table.update().where(table.c.id == counts.c.id).values(
+            child_count=counts.c.child_count
+        )
+    else:
+        count = select([func.count()]).select_from(
+            Path.__table__.join(child, child.c.id == Path.descendant)
+        ).where(and_(
+            Path.ancestor == table.c.id,
+            Path.length == 1,
+            child.c.status_id == Content.status.AVAILABLE,
+        )).as_scalar()
+
+        stmt = table.update().values(child_count=count)
+        if ids is not None:
+            stmt = stmt.where(table.c.id.in_(ids))
+
+    return session.execute(stmt).rowcount
+
+
+def update_url_paths(session):
+    """Recomputes :attr:`Content.url_path` of all content from the slugs
+
+    The url paths are cleared and top-level content gets its slug as url
+    path. Each following set based statement then fills in the content
+    whose parent has got a url path, so at most one UPDATE is issued per
+    level of the tree.
+
+    :param session: SQLAlchemy session
+    :return int: Number of content given a url path
+    """
+    table = Content.__table__
+    parent = table.alias('parent')
+    session.execute(table.update().values(url_path=None))
+
+    has_parent = exists().where(and_(
+        Path.descendant == table.c.id,
+        Path.length == 1,
+    ))
+    count = session.execute(
+        table.update().where(~has_parent).values(url_path=table.c.slug)
+    ).rowcount
+
+    joined = and_(
+        Path.descendant == table.c.id,
+        Path.length == 1,
+        Path.ancestor == parent.c.id,
+        parent.c.url_path.isnot(None),
+    )
+    if session.bind.dialect.name == "mysql":
+        # MySQL can't update a table it selects from in a subquery so join
+        # the parent in a multiple-table UPDATE instead.
+        stmt = table.update().where(and_(
+            joined, table.c.url_path.is_(None)
+        )).values(url_path=parent.c.url_path + '/' + table.c.slug)
+    else:
+        value = select([parent.c.url_path + '/' + table.c.slug]).where(
+            joined
+        ).as_scalar()
+        stmt = table.update().where(and_(
+            table.c.url_path.is_(None),
+            exists().where(joined),
+        )).values(url_path=value)
+
+    while True:
+        updated = session.execute(stmt).rowcount
+        if not updated:
+            return count
+        count += updated
+
+
+def parent_id(session, content_id):
+    """Returns the id of the parent of `content_id` or None"""
+    return session.query(Path.ancestor).filter(
+        Path.descendant == content_id,
+        Path.length == 1,
+    ).scalar()
+
+
+def tree_ids(session, *content_ids, descendants=False):
+    """Returns the ids of `content_ids` and all their ancestors
+
+    :param session: SQLAlchemy session
+    :param int content_ids: Ids of the content
+    :param bool descendants: Whether to include all descendants as well
+    :return set: Content ids
+    """
+    query = session.query(Path.ancestor).filter(
+        Path.descendant.in_(content_ids)
+    )
+    if descendants:
+        query = query.union(
+            session.query(Path.descendant).filter(
+                Path.ancestor.in_(content_ids)
+            )
+        )
+
+    return set(id for id, in query)
+
+
+def invalidate_totals(session, *content_ids, descendants=False):
+    """Invalidates the cached children totals affected by a change of
+    `content_ids`, see :meth:`yoshimi.repo.Query.paginate`.
+
+    Totals are cached per parent so the totals of all ancestors are removed.
+    Set `descendants` to True if the status of the whole subtree changed.
+    """
+    cache = get_region('totals')
+    if cache is not None and content_ids:
+        cache.delete_many(
+            tree_ids(session, *content_ids, descendants=descendants)
+        )
+
+
+def invalidate_content(session, *content_ids, descendants=False):
+    """Removes `content_ids` from the content cache, see
+    :func:`yoshimi.repo.content_getter`.
+
+    Cached content includes its lineage and url path. Set `descendants` to
+    True if those changed for the whole subtree, e.g when content is moved or
+    renamed.
+    """
+    cache = get_region('content')
+    if cache is None or not content_ids:
+        return
+
+    ids = set(content_ids)
+    if descendants:
+        ids.update(id for id, in session.query(Path.descendant).filter(
+            Path.ancestor.in_(ids)
+        ))
+    cache.delete_many(ids)
+
+
+def expire_content(session, *content_ids, descendants=False):
+    """Expires the loaded content with `content_ids` and the loaded paths
+    pointing to them.
+
+    Used after statements that bypass the ORM to refresh only the objects
+    they changed, instead of everything in the session with
+    :meth:`~sqlalchemy.orm.session.Session.expire_all`. Set `descendants`
+    to True to include the subtrees of `content_ids`.
+    """
+    loaded = [
+        (key[1], obj) for key, obj in session.identity_map.items()
+        if isinstance(obj, (Content, Path))
+    ]
+    if not loaded or not content_ids:
+        return
+
+    ids = set(content_ids)
+    if descendants:
+        ids.update(id for id, in session.query(Path.descendant).filter(
+            Path.ancestor.in_(content_ids)
+        ))
+    for identity, obj in loaded:
+        # Content is identified by its id, paths by (ancestor, descendant)
+        if not ids.isdisjoint(identity):
+            session.expire(obj)
+
+
+#: Attributes that when changed makes the cached lineage and url path of the
+#: descendants stale
+_LINEAGE_ATTRIBUTES = ('name', 'slug', 'url_path', 'status_id')
+
+
+@event.listens_for(Session, 'after_flush')
+def _invalidate_content_after_flush(session, flush_context):
+    cache = get_region('content')
+    if cache is None:
+        return
+
+    for obj in session.new:
+        if isinstance(obj, Content):
+            # The parent's child count changed
+            cache.delete_many(p.ancestor for p in obj.paths)
+
+    for obj in session.dirty:
+        if not isinstance(obj, Content) or \
+                not session.is_modified(obj, include_collections=False):
+            continue
+
+        descendants = any(
+            attributes.get_history(obj, name).has_changes()
+            for name in _LINEAGE_ATTRIBUTES
+        )
+        invalidate_content(session, obj.id, descendants=descendants)
+
+    cache.delete_many(
+        obj.id for obj in session.deleted if isinstance(obj, Content)
+    )
+
+
+@event.listens_for(Session, 'after_flush')
+def _invalidate_totals_after_flush(session, flush_context):
+    cache = get_region('totals')
+    if cache is None:
+        return
+
+    for obj in session.new:
+        if isinstance(obj, Content):
+            cache.delete_many(p.ancestor for p in obj.paths)
+
+    for obj in session.dirty:
+        if isinstance(obj, Content) and \
+                attributes.get_history(obj, 'status_id').has_changes():
+            invalidate_totals(session, obj.id)
+
+
+@event.listens_for(Content.slug, 'set', propagate=True)
+def _slug_set(target, value, oldvalue, initiator):
+    if value is None:
+        return
+
+    if target.url_path is not None:
+        prefix = target.url_path.rpartition('/')[0]
+        target.url_path = prefix + '/' + value if prefix else value
+    else:
+        target.url_path = join_url_path(target.parent, value)
+
+
+@event.listens_for(Content, 'after_update', propagate=True)
+def _cascade_url_path(mapper, connection, target):
+    """Updates the url paths of the descendants when the slug changed"""
+    history = attributes.get_history(target, 'url_path')
+    if not history.deleted or not history.added:
+        # Without a url path (e.g content created before url paths were
+        # stored) the URLs are generated from the slugs of the lineage
+        if attributes.get_history(target, 'slug').has_changes():
+            invalidate_urls(connection, target.id)
+        return
+
+    old, new = history.deleted[0], history.added[0]
+    replace_url_paths(connection, target.id, old, new, include_self=False)
+
+    if old is None:
+        return
+
+    # Keep descendants that are already loaded in the session in sync
+    prefix = old + '/'
+    for obj in list(object_session(target).identity_map.values()):
+        url_path = obj.__dict__.get('url_path')
+        if isinstance(obj, Content) and url_path and \
+                url_path.startswith(prefix):
+            if new is not None:
+                url_path = new + url_path[len(old):]
+            else:
+                url_path = None
+            attributes.set_committed_value(obj, 'url_path', url_path)
+
+
+@event.listens_for(Content.paths, 'append', propagate=True)
+@event.listens_for(Content.paths, 'remove', propagate=True)
+def _paths_changed(target, value, initiator):
+    target._reset_lineage()
+
+
+@event.listens_for(Session, 'before_flush')
+def _flush_child_count_increments(session, flush_context, instances):
+    for obj in session.dirty:
+        if isinstance(obj, Content) and obj._child_count_increment:
+            # Let the database do the increment to play well with concurrent
+            # inserts below the same parent.
+            obj.child_count = Content.child_count + obj._child_count_increment
+            obj._child_count_increment = 0
+
+
+@event.listens_for(Content, 'expire', propagate=True)
+def _content_expired(target, attrs):
+    # target is None if the object was garbage collected before expiring
+    if target is None:
+        return
+    if attrs is None or 'paths' in attrs:
+        target._reset_lineage()
+    if attrs is None or 'child_count' in attrs:
+        # The incremented value is discarded along with the pending increment
+        target._child_count_increment = 0
+
 
-    def _sort_paths(self):
-        self.paths.sort(key=lambda path: path.length, reverse=True)
+@event.listens_for(Content, 'refresh', propagate=True)
+def _content_refreshed(target, context, attrs):
+    if attrs is None or 'paths' in attrs:
+        target._reset_lineage()
 
 
 class ContentType:
@@ -1,13 +1,23 @@
+import base64
+import binascii
+import json
+import transaction
+from datetime import datetime
 from math import ceil
 from pyramid.httpexceptions import HTTPNotFound
 from sqlite3 import Connection as SQLite3Connection
+from sqlalchemy import and_
 from sqlalchemy import engine_from_config
 from sqlalchemy import event
+from sqlalchemy import func
+from sqlalchemy import inspect
+from sqlalchemy import or_
 from sqlalchemy.engine import Engine
 from sqlalchemy.ext import declarative
 from sqlalchemy.orm import scoped_session
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm.query import Query
+from sqlalchemy.sql import operators
 from zope.sqlalchemy import ZopeTransactionExtension
 
 
@@ -110,29 +120,273 @@ class Pagination(object):
                 last = num
 
 
+class CursorPagination(object):
+    """Internal helper class returned by :meth:`BaseQuery.paginate_after`.
+
+    Unlike :class:`Pagination` this uses keyset (cursor) pagination: instead
+    of an offset each page remembers the ordering values of its first and
+    last items and the next page is fetched with a `WHERE` on those values.
+    Fetching a page costs the same no matter how deep into the result it is,
+    but there are no page numbers or totals.
+
+    Cursors are opaque strings that are safe to use in URLs:
+
+    .. sourcecode:: html+jinja
+
+        {% if pagination.has_next %}
+          <a href="?cursor={{ pagination.next_cursor }}">Next</a>
+        {% endif %}
+    """
+
+    def __init__(self, query, cursor, per_page, items, has_prev, has_next,
+                 prev_cursor, next_cursor):
+        #: the unlimited query object that was used to create this
+        #: pagination object.
+        self.query = query
+        #: the cursor used to fetch this page, None for the first page
+        self.cursor = cursor
+        #: the number of items to be displayed on a page.
+        self.per_page = per_page
+        #: the items for the current page
+        self.items = items
+        #: True if a previous page exists
+        self.has_prev = has_prev
+        #: True if a next page exists
+        self.has_next = has_next
+        #: cursor of the previous page, None if there is none
+        self.prev_cursor = prev_cursor
+        #: cursor of the next page, None if there is none
+        self.next_cursor = next_cursor
+
+    def prev(self, error_out=False):
+        """Returns a :class:`CursorPagination` object for the previous
+        page."""
+        assert self.query is not None, 'a query object is required ' \
+                                       'for this method to work'
+        return self.query.paginate_after(
+            self.prev_cursor, self.per_page, error_out
+        )
+
+    def next(self, error_out=False):
+        """Returns a :class:`CursorPagination` object for the next page."""
+        assert self.query is not None, 'a query object is required ' \
+                                       'for this method to work'
+        return self.query.paginate_after(
+            self.next_cursor, self.per_page, error_out
+        )
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor can not be decoded"""
+
+
+_CURSOR_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+def encode_cursor(values, backwards=False):
+    """Encodes ordering values into an URL safe cursor
+
+    :param list values: Values of the ordering columns
+    :param bool backwards: Whether the cursor points to the previous page
+    :return str: The cursor
+    """
+    encoded = []
+    for value in values:
+        if isinstance(value, datetime):
+            value = {'dt': value.strftime(_CURSOR_DATETIME_FORMAT)}
+        encoded.append(value)
+
+    data = json.dumps({'v': encoded, 'b': backwards}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Decodes a cursor created with :func:`encode_cursor`
+
+    :param str cursor: The cursor
+    :raises InvalidCursor: If `cursor` could not be decoded
+    :return tuple: (list values, bool backwards)
+    """
+    try:
+        data = json.loads(
+            base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        )
+        values = []
+        for value in data['v']:
+            if isinstance(value, dict):
+                value = datetime.strptime(
+                    value['dt'], _CURSOR_DATETIME_FORMAT
+                )
+            values.append(value)
+        return values, bool(data['b'])
+    except (binascii.Error, KeyError, TypeError, ValueError) as e:
+        raise InvalidCursor(str(e))
+
+
 class BaseQuery(Query):
-    def paginate(self, page, per_page=30, error_out=True):
+    def paginate(self, page, per_page=30, error_out=True, total=None,
+                 window_count=True):
             """Returns `per_page` items from page `page`.  By default it will
             abort with 404 if no items were found and the page was larger than
             1.  This behavor can be disabled by setting `error_out` to `False`.
 
+            If the database supports window functions the total is fetched
+            with ``count(*) OVER ()`` in the same statement as the items.
+            Set `window_count` to `False` to use a separate count query
+            instead. If `total` is given no counting is done at all.
+
             Returns an :class:`Pagination` object.
             """
             if error_out and page < 1:
                 raise HTTPNotFound(404)
-            items = self.limit(per_page).offset((page - 1) * per_page).all()
+
+            query = self.limit(per_page).offset((page - 1) * per_page)
+            if total is None and window_count and self._can_window_count():
+                rows = query.add_columns(
+                    func.count().over().label('y_total')
+                ).all()
+                items = self._strip_columns(rows, 1)
+                if rows:
+                    total = rows[0][-1]
+            else:
+                items = query.all()
+
             if not items and page != 1 and error_out:
                 raise HTTPNotFound(404)
 
-            # No need to count if we're on the first page and there are fewer
-            # items than we expected.
-            if page == 1 and len(items) < per_page:
-                total = len(items)
-            else:
-                total = self.order_by(None).count()
+            if total is None:
+                # No need to count if we're on the first page and there are
+                # fewer items than we expected.
+                if page == 1 and len(items) < per_page:
+                    total = len(items)
+                else:
+                    total = self.order_by(None).count()
 
             return Pagination(self, page, per_page, total, items)
 
+    def paginate_after(self, cursor, per_page=30, error_out=True):
+        """Returns `per_page` items following (or preceding) `cursor`.
+        Pass in None as `cursor` to get the first page.
+
+        The query's `ORDER BY` columns, followed by the primary key as a tie
+        breaker, are used as the keyset. If the query isn't ordered it's
+        ordered by the primary key. By default it will abort with 404 if the
+        cursor is invalid, set `error_out` to `False` to get the first page
+        instead.
+
+        Returns an :class:`CursorPagination` object.
+        """
+        ordering = self._keyset_ordering()
+
+        values, backwards = None, False
+        if cursor is not None:
+            try:
+                values, backwards = decode_cursor(cursor)
+            except InvalidCursor:
+                if error_out:
+                    raise HTTPNotFound(404)
+                cursor = None
+            else:
+                if len(values) != len(ordering):
+                    if error_out:
+                        raise HTTPNotFound(404)
+                    cursor, values, backwards = None, None, False
+
+        query = self.order_by(None)
+        if values is not None:
+            query = query.filter(
+                _keyset_criterion(ordering, values, backwards)
+            )
+        query = query.order_by(*[
+            column.desc() if descending != backwards else column.asc()
+            for column, descending in ordering
+        ]).add_columns(*[column for column, _ in ordering])
+
+        rows = query.limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        if backwards:
+            rows.reverse()
+
+        entity_count = len(self.column_descriptions)
+        items = self._strip_columns(rows, len(ordering))
+
+        has_prev = has_more if backwards else cursor is not None
+        has_next = True if backwards else has_more
+        prev_cursor = next_cursor = None
+        if rows and has_prev:
+            prev_cursor = encode_cursor(
+                list(rows[0][entity_count:]), backwards=True
+            )
+        if rows and has_next:
+            next_cursor = encode_cursor(list(rows[-1][entity_count:]))
+
+        return CursorPagination(
+            self, cursor, per_page, items, has_prev, has_next, prev_cursor,
+            next_cursor
+        )
+
+    def _strip_columns(self, rows, count):
+        """Removes `count` columns added with `add_columns` from each row"""
+        if len(self.column_descriptions) == 1:
+            return [row[0] for row in rows]
+        return [row[:-count] for row in rows]
+
+    def _can_window_count(self):
+        if self._distinct:
+            return False
+        return supports_window_functions(self.session.get_bind().dialect)
+
+    def _keyset_ordering(self):
+        """Returns a list of (column, descending) tuples for the keyset"""
+        ordering = []
+        for clause in self._order_by or ():
+            modifier = getattr(clause, 'modifier', None)
+            if modifier in (operators.desc_op, operators.asc_op):
+                ordering.append(
+                    (clause.element, modifier is operators.desc_op)
+                )
+            else:
+                ordering.append((clause, False))
+
+        entity = self.column_descriptions[0]['entity']
+        for column in inspect(entity).primary_key:
+            if not any(column.shares_lineage(c) for c, _ in ordering):
+                ordering.append((column, False))
+
+        return ordering
+
+
+def supports_window_functions(dialect):
+    """Returns True if the database supports window functions such as
+    ``count(*) OVER ()`` and ``row_number() OVER (...)``"""
+    version = dialect.server_version_info or ()
+    if dialect.name == 'postgresql':
+        return True
+    if dialect.name == 'sqlite':
+        return version >= (3, 25)
+    if dialect.name == 'mysql':
+        if 'MariaDB' in version:
+            return version >= (10, 2)
+        return version >= (8, 0)
+    return False
+
+
+def _keyset_criterion(ordering, values, backwards):
+    """Builds the `WHERE` criterion selecting rows after the keyset `values`
+    (or before if `backwards`) for the given ordering."""
+    criteria = []
+    for i, (column, descending) in enumerate(ordering):
+        if descending != backwards:
+            compare = column < values[i]
+        else:
+            compare = column > values[i]
+        criteria.append(and_(*[
+            c == v for (c, _), v in zip(ordering[:i], values[:i])
+        ] + [compare]))
+
+    return or_(*criteria)
+
 
 class DeclarativeBase(object):
     query_class = BaseQuery
@@ -161,6 +415,9 @@ def setup_db(settings, extension=ZopeTransactionExtension):
     session_options = {'query_cls': BaseQuery}
     if extension is not None:
         session_options['extension'] = extension()
+        # Code committing in chunks (e.g batched deletes) must go through the
+        # transaction manager when it manages the session
+        session_options['info'] = {'yoshimi.commit': transaction.commit}
     global Session
     Session = scoped_session(sessionmaker(**session_options))
     Session.configure(bind=engine)
@@ -4,9 +4,11 @@ from sqlalchemy import (
     ForeignKey,
     Integer,
     DateTime,
+    String,
 )
 from sqlalchemy.orm import (
     backref,
+    query_expression,
     relationship,
 )
 from sqlalchemy.ext import declarative
@@ -24,7 +26,7 @@ class TrashContent(Base):
         ForeignKey('content.id', ondelete='CASCADE'),
         primary_key=True
     )
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     content = relationship(
         'Content',
         foreign_keys=[content_id],
@@ -33,3 +35,17 @@ class TrashContent(Base):
             uselist=False,
         ),
     )
+    #: Id and status of the content's parent. Only loaded by
+    #: :meth:`yoshimi.trash.Trash.items`, otherwise None.
+    parent_id = query_expression()
+    parent_status_id = query_expression()
+
+
+class Counter(Base):
+    """Named counter used to keep aggregates that are expensive to compute,
+    e.g the number of items in the trash, see
+    :meth:`yoshimi.trash.Trash.count`."""
+    __tablename__ = 'counter'
+
+    name = Column(String(50), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
@@ -11,3 +11,22 @@ class IQueryExtensions(Interface):
     methods = Attribute(
         """A list of methods to be added to a query object."""
     )
+
+
+class ICache(Interface):
+    """ Interface for caches used by Yoshimi, see :mod:`yoshimi.cache` """
+    def get(key, default=None):
+        """Returns the value stored for `key` or `default` if it is missing
+        or expired."""
+
+    def set(key, value):
+        """Stores `value` for `key`."""
+
+    def delete(key):
+        """Removes `key` if it exists."""
+
+    def delete_many(keys):
+        """Removes all `keys` that exist."""
+
+    def clear():
+        """Removes everything."""
@@ -8,19 +8,66 @@
     :copyright: (c) 2013 by Ole Morten Halvorsen
     :license: BSD, see LICENSE for more details.
 """
-from functools import partial
+from collections import namedtuple
+import pickle
 
 from pyramid.httpexceptions import HTTPNotFound
-from sqlalchemy.orm import joinedload
+from sqlalchemy import (
+    and_,
+    bindparam,
+    func,
+    insert,
+    literal_column,
+    or_,
+    select,
+    Integer,
+)
+from sqlalchemy.orm import (
+    aliased,
+    class_mapper,
+    joinedload,
+)
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.ext import baked
 from sqlalchemy.orm.exc import NoResultFound
 from zope.sqlalchemy import mark_changed
 from zope.interface import implementer
 
+from yoshimi.cache import get_region
 from yoshimi.content import Content
 from yoshimi.content import Path
+from yoshimi.content import expire_content
+from yoshimi.content import invalidate_content
+from yoshimi.content import invalidate_totals
+from yoshimi.content import join_url_path
+from yoshimi.content import parent_id
+from yoshimi.content import replace_url_paths
+from yoshimi.content import tree_ids
+from yoshimi.content import update_child_counts
+from yoshimi.db import supports_window_functions
+from yoshimi.entities import TrashContent
 from yoshimi.interfaces import IQueryExtensions
 from yoshimi.utils import Proxy
-from yoshimi.trash import Trash
+from yoshimi.trash import (
+    Trash,
+    adjust_trash_count,
+)
+
+
+#: Cache of compiled statements for queries built by :class:`Query`
+bakery = baked.bakery()
+
+#: Query methods that are run as baked queries when possible
+_BAKED_METHODS = ('all', 'first', 'one', 'one_or_none')
+
+#: Built-in ops that can be baked mapped to whether they take a parameter.
+#: Ops without one are baked with their arguments as part of the cache key.
+_BAKED_OPS = {
+    'by_id': True,
+    'depth': True,
+    'load_path': False,
+    'status': False,
+}
 
 
 class Repo(Proxy):
@@ -47,9 +94,58 @@ class Repo(Proxy):
     def move(self, subject):
         return MoveOperation(self._proxy, subject)
 
-    def delete(self, subject):
+    def delete(self, subject, **options):
+        """Deletes `subject` and its subtree, see
+        :meth:`DeleteOperation.delete` for the `options`"""
         op = DeleteOperation(self._proxy)
-        op.delete(subject)
+        return op.delete(subject, **options)
+
+    def bulk_insert(self, parent, rows, content_type=Content):
+        """Inserts many content objects below `parent` in one go.
+
+        Rows are inserted with SQLAlchemy Core and the closure table is
+        populated with set based statements. No
+        :class:`~yoshimi.content.Content` or :class:`~yoshimi.content.Path`
+        objects are instantiated which makes this suitable for large imports::
+
+            request.y_repo.bulk_insert(section, [
+                {'name': 'Article 1', 'slug': 'article-1', 'title': 'A1'},
+                {'name': 'Article 2', 'slug': 'article-2', 'title': 'A2'},
+            ], content_type=Article)
+
+        :param parent: Where in the tree to place the content. Pass in None to
+         create new roots.
+        :type parent: :class:`~yoshimi.content.Content`
+        :param list rows: List of dicts mapping attribute names to values
+        :param content_type: Content type to create
+        :return list: Ids of the created content, in the same order as `rows`
+        """
+        op = BulkInsertOperation(self._proxy)
+        return op.insert(parent, rows, content_type)
+
+    def bulk_insert_tree(self, parent, nodes, content_type=Content):
+        """Inserts a nested tree of content below `parent` in one go.
+
+        Works like :meth:`bulk_insert`, but each node may have a `children`
+        key with a list of nodes to insert below it. A node can also override
+        the content type with a `content_type` key::
+
+            request.y_repo.bulk_insert_tree(root, [
+                {'name': 'News', 'slug': 'news', 'content_type': Folder,
+                 'children': [
+                     {'name': 'Article 1', 'slug': 'article-1'},
+                 ]},
+            ], content_type=Article)
+
+        :param parent: Where in the tree to place the content. Pass in None to
+         create new roots.
+        :type parent: :class:`~yoshimi.content.Content`
+        :param list nodes: List of dicts mapping attribute names to values
+        :param content_type: Default content type to create
+        :return list: Ids of the created content in depth first order
+        """
+        op = BulkInsertOperation(self._proxy)
+        return op.insert_tree(parent, nodes, content_type)
 
     # @TODO: entities should be *entities to match SQLA Query api
     def query(self, entities):
@@ -94,32 +190,137 @@ class Repo(Proxy):
         )
         return Query(self._proxy, entities, exts.methods)
 
+    def children_of(self, parents, *content_types, depth=1,
+                    limit_per_parent=None):
+        """Fetches the children of many parents in one query
+
+        Useful for navigation menus and tree widgets where the children of
+        several nodes are needed at once::
+
+            children = request.y_repo.children_of(
+                sections, Article, limit_per_parent=5
+            )
+            for section in sections:
+                latest_articles = children[section.id]
+
+        :param list parents: Content objects or ids to fetch children of
+        :param tuple content_types: Content Types to fetch. If you don't
+         specify any all content types will be fetched.
+        :param int depth: How many levels below each parent to fetch
+        :param int limit_per_parent: Maximum number of children to fetch for
+         each parent
+        :return dict: Parent id mapped to a list of its children ordered by
+         depth and id
+        """
+        return children_of(
+            self._proxy, parents, *content_types, depth=depth,
+            limit_per_parent=limit_per_parent
+        )
+
+    def tree(self, root, depth=None, content_types=()):
+        """Fetches the subtree below `root` as nested :class:`.TreeNode`
+        objects
+
+        The whole subtree is fetched with one query and assembled in memory
+        which makes this suited for menus, sitemaps and exports::
+
+            root = request.y_repo.tree(section, depth=2)
+            for node in root.children:
+                print(node.name, [child.name for child in node.children])
+
+        :param root: Content object or id to fetch the subtree of
+        :param int depth: How many levels below `root` to fetch. Pass in None
+         to fetch the whole subtree.
+        :param tuple content_types: Content Types to fetch. If you don't
+         specify any all content types will be fetched. Content below content
+         of a type not fetched is left out.
+        :return: The root node or None if `root` isn't available
+        :rtype: :class:`.TreeNode`
+        """
+        return tree(
+            self._proxy, root, depth=depth, content_types=content_types
+        )
+
     @property
     def trash(self):
         return Trash(self._proxy)
 
 
+class TreeNode:
+    """Lightweight read only stand-in for a content object in a tree
+    returned by :meth:`Repo.tree`"""
+    __slots__ = (
+        'id', 'parent_id', 'name', 'slug', 'type', 'url_path', 'child_count',
+        'children',
+    )
+
+    def __init__(self, id, parent_id, name, slug, type, url_path,
+                 child_count):
+        self.id = id
+        self.parent_id = parent_id
+        self.name = name
+        self.slug = slug
+        self.type = type
+        self.url_path = url_path
+        self.child_count = child_count
+        self.children = []
+
+    @property
+    def has_children(self):
+        """True if the content has any available children. This is also
+        true when the children are below the fetched depth."""
+        return bool(self.child_count)
+
+    def __repr__(self):
+        return '<TreeNode id=%r name=%r children=%d>' % (
+            self.id, self.name, len(self.children)
+        )
+
+
 class Query(Proxy):
+    """Query for content in the repository.
+
+    Queries are immutable. Each op (e.g :meth:`children` or :meth:`depth`)
+    returns a new query leaving the original untouched, and the SQLAlchemy
+    query is only built once per query object. This makes it safe to build a
+    query once, e.g at module level, and reuse it across requests by binding
+    it to the request's session::
+
+        LATEST = Query(None, Article).load_path()
+
+        def view(request):
+            return LATEST.with_session(request.y_db).all()
+
+    Any attribute not provided by this class is looked up on the compiled
+    SQLAlchemy query, see :meth:`get_query`.
+    """
     def __init__(self, session, entities, exts=None):
         self.session = session
         self._entities = entities
         self._entities_list = self._to_list(entities)
-        self._proxy = None
         self.exts = exts if exts else {}
         self._ops = {}
         self._destructive_op = {}
+        self._compiled = {}
 
     def __getattr__(self, name):
         if name in self.exts:
             return self._apply_extension(name)
 
+        if name in _BAKED_METHODS:
+            result = self._baked()
+            if result is not None:
+                return getattr(result, name)
+
         # Skip pre checks if we're using query.get() as it throws an exception
         # if there's existing filters
         enable_pre_checks = False if name == 'get' else True
 
-        self._compile(enable_pre_checks)
+        return getattr(self._compile(enable_pre_checks), name)
 
-        return getattr(self._proxy, name)
+    @property
+    def _proxy(self):
+        return self.get_query()
 
     def children(self, *content_types):
         """Fetches a list of children returning a query that can be filtered
@@ -128,76 +329,180 @@ class Query(Proxy):
         :param tuple content_types: Content Types to fetch. If you don't
          specify any all content types will be fetched.
         """
-        self._set_destructive_op(
-            'children', partial(
-                children,
-                self.session.query,
-                self._entities_list[0],
-                *content_types
-            )
+        return self._set_destructive_op(
+            'children', children, self._entities_list[0], *content_types
         )
 
-        return self
+    def by_id(self, id):
+        """Limits the query to the content with `id`
+
+        Unlike :meth:`get` the status check and any other filters are
+        applied, and the query can be baked.
+        """
+        return self._add_op('by_id', by_id, id)
 
     def depth(self, levels):
-        self._add_op('depth', partial(depth, lambda: self._proxy, levels))
-        return self
+        return self._add_op('depth', depth, levels)
 
     def load_path(self):
-        self._add_op('load_path', partial(
-            load_path, lambda: self._proxy, self._entities_list[0])
-        )
-        return self
+        return self._add_op('load_path', load_path)
 
     def status(self, status_id):
-        self._add_op('status', partial(status, lambda: self._proxy, status_id))
+        return self._add_op('status', status, status_id)
+
+    def with_session(self, session):
+        """Returns a copy of this query bound to `session`
 
-        return self
+        :param session: SQLAlchemy session
+        :type session: :class:`~sqlalchemy.orm.session.Session`
+        :rtype: :class:`.Query`
+        """
+        query = self._clone()
+        query.session = session
+        return query
 
     def get_query(self):
-        self._compile()
-        return self._proxy
+        """Returns the SQLAlchemy query. It's built on first use and reused
+        afterwards.
+
+        :rtype: :class:`~yoshimi.db.BaseQuery`
+        """
+        return self._compile()
+
+    def paginate(self, page, per_page=30, error_out=True):
+        """Returns a :class:`~yoshimi.db.Pagination` for page `page`
+
+        Works like :meth:`yoshimi.db.BaseQuery.paginate`. Additionally, when
+        fetching children and the `totals` cache region is enabled (see
+        :mod:`yoshimi.cache`) the total is cached per parent so only the
+        items are fetched on subsequent page views. The cached totals are
+        invalidated when children are added, moved, trashed or deleted.
+        """
+        query = self.get_query()
+        cache = get_region('totals')
+        key = self._totals_key() if cache is not None else None
+        if key is None:
+            return query.paginate(page, per_page, error_out)
+
+        parent_id, query_key = key
+        totals = cache.get(parent_id) or {}
+        pagination = query.paginate(
+            page, per_page, error_out, total=totals.get(query_key)
+        )
+        if query_key not in totals:
+            totals = dict(totals)
+            totals[query_key] = pagination.total
+            cache.set(parent_id, totals)
+
+        return pagination
+
+    def _totals_key(self):
+        """Returns (parent id, key) identifying the total of a children
+        query or None if the query isn't a children query"""
+        if 'children' not in self._destructive_op:
+            return None
+
+        children_op = self._destructive_op['children']
+        key = [repr(children_op.args[1:])]
+        for name, op in sorted(self._ops.items()):
+            if name != 'load_path':
+                key.append('%s%r%r' % (
+                    name, op.args, sorted(op.kwargs.items())
+                ))
+
+        return children_op.args[0].id, ':'.join(key)
+
+    def _baked(self):
+        """Returns the query as a :class:`sqlalchemy.ext.baked.Result` or None
+        if the query can't be baked
+
+        The compiled statement is cached per chain of ops (and the content
+        types or entities queried) in :data:`bakery`, so only the parameters
+        are bound per call. Queries using extensions aren't baked as their
+        ops may depend on more than their arguments.
+        """
+        ops = self._checked_ops()
+        if any(name not in _BAKED_OPS for name in ops):
+            return None
+
+        params = {}
+        if 'children' in self._destructive_op:
+            children_op = self._destructive_op['children']
+            content_types = children_op.args[1:]
+            bq = bakery(
+                lambda s: children(s.query, _ParentParam, *content_types),
+                'children', content_types
+            )
+            params['parent_id'] = children_op.args[0].id
+        elif all(isinstance(e, type) for e in self._entities_list):
+            entities = tuple(self._entities_list)
+            bq = bakery(lambda s: s.query(*entities), 'query', entities)
+        else:
+            return None
+
+        for name, op in ops.items():
+            if _BAKED_OPS[name]:
+                bq.add_criteria(_baked_op(op.func, name), name)
+                params[name] = op.args[0]
+            else:
+                bq.add_criteria(_baked_static_op(op), name, *op.args)
+
+        return bq(self.session).params(**params)
 
     def _apply_extension(self, name):
         def inner(*args, **kwargs):
-            self._add_op(
-                name,
-                partial(
-                    self.exts[name], lambda: self._proxy, *args, **kwargs
-                )
-            )
-            return self
+            return self._add_op(name, self.exts[name], *args, **kwargs)
         return inner
 
     def _compile(self, enable_pre_checks=True):
-        for _, op_func in self._destructive_op.items():
-            self._proxy = op_func()
+        if enable_pre_checks in self._compiled:
+            return self._compiled[enable_pre_checks]
+
+        query = None
+        for _, op in self._destructive_op.items():
+            query = op.func(self.session.query, *op.args, **op.kwargs)
             break
 
-        if self._proxy is None:
-            self._proxy = self._default_query()
+        if query is None:
+            query = self._default_query()
 
-        if enable_pre_checks:
-            self._pre_checks()
+        ops = self._checked_ops() if enable_pre_checks else self._ops
+        for _, op in ops.items():
+            query = op.func(_getter(query), *op.args, **op.kwargs)
 
-        for _, op_func in self._ops.items():
-            self._proxy = op_func()
+        self._compiled[enable_pre_checks] = query
+        return query
 
     def _default_query(self):
         return self.session.query(self._entities)
 
-    def _pre_checks(self):
-        if 'children' in self._destructive_op and 'depth' not in self._ops:
-            self.depth(1)
+    def _checked_ops(self):
+        """Returns the ops with the default depth and status ops added"""
+        ops = dict(self._ops)
+        if 'children' in self._destructive_op and 'depth' not in ops:
+            ops['depth'] = _Op(depth, (1,), {})
+
+        if 'status' not in ops:
+            ops['status'] = _Op(status, (Content.status.AVAILABLE,), {})
+
+        return ops
 
-        if 'status' not in self._ops:
-            self.status(Content.status.AVAILABLE)
+    def _clone(self):
+        query = self.__class__.__new__(self.__class__)
+        query.__dict__.update(self.__dict__)
+        query._compiled = {}
+        return query
 
-    def _add_op(self, op_name, op_func):
-        self._ops[op_name] = op_func
+    def _add_op(self, op_name, op_func, *args, **kwargs):
+        query = self._clone()
+        query._ops = dict(self._ops)
+        query._ops[op_name] = _Op(op_func, args, kwargs)
+        return query
 
-    def _set_destructive_op(self, op_name, op_func):
-        self._destructive_op = {op_name: op_func}
+    def _set_destructive_op(self, op_name, op_func, *args, **kwargs):
+        query = self._clone()
+        query._destructive_op = {op_name: _Op(op_func, args, kwargs)}
+        return query
 
     def _to_list(self, x):
         if not isinstance(x, (list, tuple)):
@@ -206,19 +511,63 @@ class Query(Proxy):
             return x
 
 
-def load_path(query_getter, subject):
+#: An op of a :class:`Query`. `func` is called with a callable returning the
+#: query to apply the op to followed by `args` and `kwargs`.
+_Op = namedtuple('_Op', ['func', 'args', 'kwargs'])
+
+
+def _getter(query):
+    return lambda: query
+
+
+class _ParentParam:
+    """Stands in for the parent in baked children queries"""
+    id = bindparam('parent_id')
+
+
+def _baked_op(op_func, name):
+    """Returns a baked query step applying `op_func` with a bound parameter
+    named `name`"""
+    return lambda query: op_func(lambda: query, bindparam(name))
+
+
+def _baked_static_op(op):
+    """Returns a baked query step applying `op` with its own arguments"""
+    return lambda query: op.func(lambda: query, *op.args, **op.kwargs)
+
+
+def load_path(query_getter):
+    """Eagerly loads the paths and the ancestors of each path so the lineage
+    (e.g for generating URLs) is available without any further queries.
+    """
     query = query_getter()
-    jl = joinedload('paths', innerjoin=True)
+    jl = joinedload(Content.paths, innerjoin=True) \
+        .joinedload(Path.ancestor_content, innerjoin=True)
 
     return query.options(jl)
 
 
+def by_id(query_getter, id):
+    return query_getter().filter(Content.id == id)
+
+
 def depth(query_getter, levels):
     return query_getter().filter(Path.length.between(1, levels))
 
 
 def status(query_getter, status_id):
-    return query_getter().filter(Content.status_id == status_id)
+    return query_getter().filter(status_is(status_id))
+
+
+def status_is(status_id):
+    """Returns a criterion matching content with `status_id`
+
+    The status is rendered as a literal rather than a bound parameter so the
+    database can match it against partial indexes, e.g
+    ``ix_content_available_type``, when planning the statement rather than
+    depending on the bound value (which e.g older SQLite versions don't).
+    """
+    return Content.status_id == literal_column(str(int(status_id)), Integer)
 
 
 def children(query_maker, parent, *content_types):
@@ -246,6 +595,119 @@ def children(query_maker, parent, *content_types):
     return q
 
 
+def children_of(session, parents, *content_types, depth=1,
+                limit_per_parent=None):
+    """Fetches the children of many parents, see :meth:`Repo.children_of`
+
+    When limiting the number of children per parent the rows are numbered
+    per parent with `row_number()` if the database supports window
+    functions, otherwise the children are limited after they're fetched.
+
+    :rtype: dict
+    """
+    parent_ids = [getattr(p, 'id', p) for p in parents]
+    rv = dict((id, []) for id in parent_ids)
+    if not parent_ids:
+        return rv
+
+    paths = session.query(
+        Path.ancestor.label('ancestor'),
+        Path.descendant.label('descendant'),
+        Path.length.label('length'),
+    ).join(
+        Content, Content.id == Path.descendant
+    ).filter(
+        Path.ancestor.in_(parent_ids),
+        Path.length.between(1, depth),
+        status_is(Content.status.AVAILABLE),
+    )
+    if content_types:
+        paths = paths.filter(Content.type.in_(
+            [t.__mapper_args__['polymorphic_identity'] for t in content_types]
+        ))
+
+    window_limit = limit_per_parent is not None and \
+        supports_window_functions(session.bind.dialect)
+    if window_limit:
+        paths = paths.add_columns(
+            func.row_number().over(
+                partition_by=Path.ancestor,
+                order_by=(Path.length, Path.descendant),
+            ).label('row_number')
+        )
+    paths = paths.subquery()
+
+    q = session.query(Content, paths.c.ancestor).with_polymorphic(
+        content_types
+    ).join(
+        paths, paths.c.descendant == Content.id
+    ).order_by(
+        paths.c.ancestor, paths.c.length, Content.id
+    )
+    if window_limit:
+        q = q.filter(paths.c.row_number <= limit_per_parent)
+
+    for content, ancestor in q:
+        children = rv[ancestor]
+        if limit_per_parent is None or len(children) < limit_per_parent:
+            children.append(content)
+
+    return rv
+
+
+def tree(session, root, depth=None, content_types=()):
+    """Fetches the subtree below `root`, see :meth:`Repo.tree`
+
+    Each row is a descendant and the ancestor of its `length = 1` path, i.e
+    its parent. Rows are ordered by depth so a node's parent has always been
+    seen before the node itself which lets the tree be assembled in one pass.
+
+    :rtype: :class:`TreeNode`
+    """
+    root_id = getattr(root, 'id', root)
+    subtree = aliased(Path)
+    parent = aliased(Path)
+
+    q = session.query(
+        Content.id,
+        parent.ancestor,
+        Content.name,
+        Content.slug,
+        Content.type,
+        Content.url_path,
+        Content.child_count,
+    ).join(
+        subtree, subtree.descendant == Content.id
+    ).outerjoin(
+        parent, and_(parent.descendant == Content.id, parent.length == 1)
+    ).filter(
+        subtree.ancestor == root_id,
+        status_is(Content.status.AVAILABLE),
+    ).order_by(subtree.length, Content.id)
+
+    if depth is not None:
+        q = q.filter(subtree.length <= depth)
+    if content_types:
+        q = q.filter(or_(subtree.length == 0, Content.type.in_(
+            [t.__mapper_args__['polymorphic_identity'] for t in content_types]
+        )))
+
+    nodes = {}
+    root_node = None
+    for row in q:
+        node = TreeNode(*row)
+        if node.id == root_id:
+            root_node = node
+        elif node.parent_id in nodes:
+            nodes[node.parent_id].children.append(node)
+        else:
+            # Parent was filtered out
+            continue
+        nodes[node.id] = node
+
+    return root_node
+
+
 def content_getter(repo, id):
     """
     Responsible for taking a unique id to a content object and fetching it from
@@ -257,15 +719,39 @@ def content_getter(repo, id):
     We avoid the use of get() as SQLAlchemy does not allow get() to be used
     with filters.
 
+    If the `content` cache region is enabled (see :mod:`yoshimi.cache`) the
+    content and its lineage is cached by id and merged into the session
+    without any queries on subsequent calls, unless the session already holds
+    the content in which case that instance is used. Cached content is
+    invalidated when it or its ancestors are changed, moved, trashed or
+    deleted.
+
     :param repo: Repository
     :type repo: :class:`~.Repo`
     :param id: Unique identifier id of a content object
     """
+    cache = get_region('content')
+    if cache is not None:
+        # Merging would overwrite the state, including unflushed changes, of
+        # content already in the session so only merge content missing there
+        content = repo.identity_map.get(identity_key(Content, id))
+        if content is not None and content.is_available:
+            return content
+
+        cached = cache.get(id)
+        if cached is not None:
+            return repo.merge(pickle.loads(cached), load=False)
+
     try:
-        return repo.query(Content).load_path().filter_by(id=id).one()
+        content = repo.query(Content).load_path().by_id(id).one()
     except NoResultFound:
         raise HTTPNotFound
 
+    if cache is not None:
+        cache.set(id, pickle.dumps(content))
+
+    return content
+
 
 class MoveOperation:
     def __init__(self, session, subject):
@@ -278,17 +764,41 @@ class MoveOperation:
         This will also recursivly move all children of this below the content
         object.
 
-        Because this method uses raw queries all objects in the session will
-        be expired after calling this method.
+        Because this method uses raw queries the moved content, its old and
+        new ancestors and their paths will be expired after calling this
+        method. Other objects in the session are left untouched.
 
         :param new_parent: The new parent/destination for the move
         :type new_parent: `yoshimi.content.Content`
         """
+        old_url_path = self._subject.url_path
+        new_url_path = join_url_path(new_parent, self._subject.slug)
+        old_parent_id = parent_id(self._session, self._subject.id)
+        # Ancestors whose paths or child counts change, read before the move
+        ancestors = tree_ids(self._session, self._subject.id, new_parent.id)
+        invalidate_totals(self._session, self._subject.id)
+        invalidate_totals(self._session, new_parent.id)
+        invalidate_content(
+            self._session, self._subject.id, descendants=True
+        )
+        invalidate_content(
+            self._session,
+            *[id for id in (old_parent_id, new_parent.id) if id is not None]
+        )
+
         self._del_non_interconnected_paths(self._session, self._subject.id)
         self._recreate_paths(self._session, self._subject.id, new_parent.id)
+        replace_url_paths(
+            self._session, self._subject.id, old_url_path, new_url_path
+        )
+        update_child_counts(
+            self._session,
+            [id for id in (old_parent_id, new_parent.id) if id is not None]
+        )
 
         mark_changed(self._session)
-        self._session.expire_all()
+        expire_content(self._session, *ancestors)
+        expire_content(self._session, self._subject.id, descendants=True)
 
     def _del_non_interconnected_paths(self, session, subject_id):
         """Deletes paths that are not interconnected."""
@@ -334,12 +844,54 @@ class DeleteOperation:
     def __init__(self, session):
         self._session = session
 
-    def delete(self, target):
+    def delete(self, target, batch_size=None, progress=None, dry_run=False,
+               commit=None):
         """
         Need to fetch all content in a subtree, then delete them.
 
         Paths will be deleted thanks to cascading deletes.
+
+        By default the subtree is deleted with one statement. For huge
+        subtrees pass `batch_size` to delete it bottom-up (deepest content
+        first) in chunks of `batch_size` content, each chunk committed in
+        its own transaction. If interrupted the remaining subtree is left
+        intact and can be deleted by calling this method again::
+
+            repo.delete(section, batch_size=1000)
+
+        :param target: Content to delete
+        :param int batch_size: Number of content to delete per transaction
+        :param callable progress: Called with the number of content deleted
+         so far and the total after each chunk
+        :param bool dry_run: Don't delete anything, return the number of rows
+         that would be deleted instead
+        :param callable commit: Commits a chunk. Defaults to
+         `transaction.commit` for sessions created by
+         :func:`yoshimi.db.setup_db` with the transaction manager and to
+         committing the session otherwise.
+        :return: Dict of row counts per table if `dry_run` is set
         """
+        if dry_run:
+            return self.count(target)
+
+        target_parent_id = parent_id(self._session, target.id)
+        invalidate_totals(self._session, target.id)
+        invalidate_content(self._session, target.id, descendants=True)
+        if target_parent_id is not None:
+            invalidate_content(self._session, target_parent_id)
+
+        if commit is None:
+            commit = self._session.info.get(
+                'yoshimi.commit', self._session.commit
+            )
+
+        if batch_size is not None:
+            self._delete_in_batches(
+                target.id, target_parent_id, batch_size, progress, commit
+            )
+            return
+
+        trashed = self._trashed_count(target.id)
         if self._session.bind.dialect.name == "mysql":
             self._session.execute("""
                 DELETE content from content
@@ -360,6 +912,271 @@ class DeleteOperation:
             )
             q.delete(synchronize_session=False)
 
+        adjust_trash_count(self._session, -trashed)
+        if target_parent_id is not None:
+            update_child_counts(self._session, [target_parent_id])
+
+    def count(self, target):
+        """Returns the number of rows deleting `target` would delete
+
+        :return dict: Row counts for the `content`, `path` and `trash` tables
+        """
+        subtree = self._session.query(Path.descendant).filter(
+            Path.ancestor == target.id
+        )
+        return {
+            'content': subtree.count(),
+            'path': self._session.query(Path).filter(
+                Path.descendant.in_(subtree.subquery())
+            ).count(),
+            'trash': self._trashed_count(target.id),
+        }
+
+    def _trashed_count(self, target_id):
+        """Returns the number of trash entries in the subtree of
+        `target_id`"""
+        return self._session.query(TrashContent).join(
+            Path, Path.descendant == TrashContent.content_id
+        ).filter(
+            Path.ancestor == target_id
+        ).count()
+
+    def _delete_in_batches(self, target_id, target_parent_id, batch_size,
+                           progress, commit):
+        table = Content.__table__
+        batch = select([Path.descendant]).where(
+            Path.ancestor == target_id
+        ).order_by(
+            Path.length.desc(), Path.descendant
+        ).limit(batch_size)
+
+        total = self._session.query(Path).filter(
+            Path.ancestor == target_id
+        ).count()
+        deleted = 0
+        while True:
+            ids = [id for id, in self._session.execute(batch)]
+            if not ids:
+                break
+
+            # Count the chunk's trash entries before they cascade away so
+            # the counter stays right if the delete is interrupted
+            trashed = self._session.query(TrashContent).filter(
+                TrashContent.content_id.in_(ids)
+            ).count()
+            self._session.execute(table.delete().where(table.c.id.in_(ids)))
+            adjust_trash_count(self._session, -trashed)
+            if target_id in ids and target_parent_id is not None:
+                # The target is deleted last, in the same transaction
+                update_child_counts(self._session, [target_parent_id])
+            mark_changed(self._session)
+            commit()
+
+            deleted += len(ids)
+            if progress is not None:
+                progress(deleted, total)
+
+
+class BulkInsertOperation:
+    def __init__(self, session):
+        self._session = session
+
+    def insert(self, parent, rows, content_type=Content):
+        """Inserts `rows` as direct children of `parent`
+
+        See :meth:`Repo.bulk_insert`.
+        """
+        nodes = [dict(row, content_type=content_type) for row in rows]
+        return self.insert_tree(parent, nodes, content_type)
+
+    def insert_tree(self, parent, nodes, content_type=Content):
+        """Inserts a nested tree of `nodes` below `parent`
+
+        The tree is inserted one level at a time. On PostgreSQL the ids of a
+        level are allocated from the sequence up front so its content rows
+        are inserted with executemany, one statement per content type.
+        Other databases only hand out ids when inserting, so there the
+        content rows fall back to one INSERT each. The rows of the content
+        types' own tables are always inserted with executemany.
+
+        All `path` rows are created with executemany too: one statement for
+        the self referencing rows and one `INSERT ... SELECT` per tree level
+        copying the parent's ancestor paths.
+
+        See :meth:`Repo.bulk_insert_tree`.
+        """
+        if parent is not None and parent.id is None:
+            self._session.flush()
+
+        top = {
+            'id': parent.id if parent is not None else None,
+            'url_path': parent.url_path if parent is not None else None,
+            'children': [],
+        }
+        levels = self._insert_nodes(top, nodes, content_type)
+
+        ids = []
+        self._collect_ids(top, ids)
+        self._insert_self_paths(ids)
+        for level in levels:
+            self._insert_ancestor_paths(level)
+
+        if parent is not None:
+            update_child_counts(self._session, [parent.id])
+            invalidate_totals(self._session, parent.id)
+            invalidate_content(self._session, parent.id)
+
+        if parent is not None and parent in self._session:
+            self._session.expire(parent, ['ancestor_paths', 'child_count'])
+        mark_changed(self._session)
+
+        return ids
+
+    def _insert_nodes(self, top, nodes, content_type):
+        """Inserts the content of `nodes` below `top` level by level
+
+        Every inserted node is added to its parent's `children` as a dict
+        with its `id`, `url_path` and `children`. Returns the `path` rows
+        needed to link each level below the top to its parents.
+        """
+        levels = []
+        pending = [(top, node) for node in nodes]
+        while pending:
+            entries = []
+            for parent, node in pending:
+                node = dict(node)
+                children = node.pop('children', ())
+                node_type = node.pop('content_type', content_type)
+                if parent['id'] is None:
+                    node['url_path'] = node['slug']
+                elif parent['url_path'] is not None:
+                    node['url_path'] = parent['url_path'] + '/' + node['slug']
+                else:
+                    node['url_path'] = None
+                node['child_count'] = sum(
+                    1 for child in children
+                    if child.get('status_id') in
+                    (None, Content.status.AVAILABLE)
+                )
+
+                entry = {'url_path': node['url_path'], 'children': []}
+                parent['children'].append(entry)
+                entries.append((entry, parent, node_type, node, children))
+
+            by_type = {}
+            for entry, _, node_type, node, _ in entries:
+                by_type.setdefault(node_type, []).append((entry, node))
+            for node_type, type_entries in by_type.items():
+                self._insert_content(node_type, type_entries)
+
+            level = [
+                {'descendant': entry['id'], 'parent': parent['id']}
+                for entry, parent, _, _, _ in entries
+                if parent['id'] is not None
+            ]
+            if level:
+                levels.append(level)
+            pending = [
+                (entry, child)
+                for entry, _, _, _, children in entries for child in children
+            ]
+
+        return levels
+
+    def _collect_ids(self, entry, ids):
+        for child in entry['children']:
+            ids.append(child['id'])
+            self._collect_ids(child, ids)
+
+    def _insert_content(self, content_type, entries):
+        """Inserts a row per `(entry, values)` of `entries` into the tables
+        of `content_type` and sets the ids of the entries"""
+        mapper = class_mapper(content_type)
+        tables = []
+        for m in reversed(list(mapper.iterate_to_root())):
+            if m.local_table not in tables:
+                tables.append(m.local_table)
+
+        table_rows = dict((table, []) for table in tables)
+        for _, values in entries:
+            row_values = dict((table, {}) for table in tables)
+            for key, value in values.items():
+                column = mapper.columns[key]
+                row_values[column.table][column.key] = value
+            for table in tables:
+                table_rows[table].append(row_values[table])
+
+        base_table = tables[0]
+        base_rows = table_rows[base_table]
+        for row in base_rows:
+            row[mapper.polymorphic_on.key] = mapper.polymorphic_identity
+
+        ids = self._allocate_ids(base_table, len(base_rows))
+        if ids is None:
+            ids = [
+                self._session.execute(
+                    base_table.insert(), row
+                ).inserted_primary_key[0]
+                for row in base_rows
+            ]
+        else:
+            for row, id in zip(base_rows, ids):
+                row['id'] = id
+            self._insert_rows(base_table, base_rows)
+
+        for (entry, _), id in zip(entries, ids):
+            entry['id'] = id
+
+        for table in tables[1:]:
+            for row, id in zip(table_rows[table], ids):
+                row['id'] = id
+            self._insert_rows(table, table_rows[table])
+
+    def _allocate_ids(self, table, count):
+        """Returns `count` new ids from the sequence of `table`'s primary key
+        or None if the database only generates ids when inserting"""
+        if self._session.bind.dialect.name != 'postgresql':
+            return None
+
+        sequence = func.pg_get_serial_sequence(table.fullname, 'id')
+        return sorted(id for id, in self._session.execute(
+            select([func.nextval(sequence)]).select_from(
+                func.generate_series(1, count)
+            )
+        ))
+
+    def _insert_rows(self, table, rows):
+        """Inserts `rows` with executemany, one statement per set of keys"""
+        groups = {}
+        for row in rows:
+            groups.setdefault(tuple(sorted(row)), []).append(row)
+        for group in groups.values():
+            self._session.execute(table.insert(), group)
+
+    def _insert_self_paths(self, ids):
+        if not ids:
+            return
+
+        self._session.execute(
+            Path.__table__.insert(),
+            [{'ancestor': id, 'descendant': id, 'length': 0} for id in ids]
+        )
+
+    def _insert_ancestor_paths(self, rows):
+        select_paths = select([
+            Path.ancestor,
+            bindparam('descendant', type_=Integer),
+            Path.length + 1,
+        ]).where(
+            Path.descendant == bindparam('parent', type_=Integer)
+        )
+        self._session.execute(
+            insert(Path.__table__).from_select(
+                ('ancestor', 'descendant', 'length'), select_paths
+            ),
+            rows
+        )
+
 
 @implementer(IQueryExtensions)
 class _QueryExtensions:
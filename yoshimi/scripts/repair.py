@@ -0,0 +1,87 @@
+"""
+    yoshimi.scripts.repair
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Command line script for recomputing denormalized data from the source of
+    truth, e.g after a crash or manual changes to the database::
+
+        yoshimi-repair production.ini child-counts
+
+    :copyright: (c) 2013 by Ole Morten Halvorsen
+    :license: BSD, see LICENSE for more details.
+"""
+import argparse
+import os
+import sys
+from pyramid.paster import (
+    get_appsettings,
+    setup_logging,
+)
+from yoshimi import db
+from yoshimi.content import (
+    update_child_counts,
+    update_url_paths,
+)
+from yoshimi.trash import Trash
+
+
+def repair_child_counts(session):
+    """Recomputes the child count of all content from the closure table
+
+    :param session: SQLAlchemy session
+    :return str: Summary of what was repaired
+    """
+    count = update_child_counts(session)
+    return 'Recomputed child counts of %s content' % count
+
+
+def repair_trash_count(session):
+    """Recomputes the number of entries in the trash
+
+    :param session: SQLAlchemy session
+    :return str: Summary of what was repaired
+    """
+    count = Trash(session).recount()
+    return 'Recomputed trash count: %s' % count
+
+
+def repair_url_paths(session):
+    """Recomputes the url path of all content from the slugs, e.g for
+    content created before url paths were stored
+
+    :param session: SQLAlchemy session
+    :return str: Summary of what was repaired
+    """
+    count = update_url_paths(session)
+    return 'Recomputed url paths of %s content' % count
+
+
+COMMANDS = {
+    'child-counts': repair_child_counts,
+    'trash-count': repair_trash_count,
+    'url-paths': repair_url_paths,
+}
+
+
+def main(argv=sys.argv):
+    parser = argparse.ArgumentParser(
+        prog=os.path.basename(argv[0]),
+        description='Recomputes denormalized data in the database.',
+    )
+    parser.add_argument('config_uri', help='Configuration file to use')
+    parser.add_argument('command', choices=sorted(COMMANDS))
+    args = parser.parse_args(argv[1:])
+
+    setup_logging(args.config_uri)
+    settings = get_appsettings(args.config_uri)
+    db.setup_db(settings, extension=None)
+
+    session = db.Session()
+    try:
+        print(COMMANDS[args.command](session))
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
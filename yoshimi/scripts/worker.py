@@ -0,0 +1,114 @@
+"""
+    yoshimi.scripts.worker
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Command line script running the background job that deletes content
+    pending deletion, see :class:`yoshimi.worker.DeletionWorker`::
+
+        yoshimi-worker production.ini
+
+    The worker exits when there's nothing left to delete, which makes it
+    suitable for cron. Use ``--poll`` to keep it running.
+
+    Defaults are read from the application settings and can be overridden on
+    the command line::
+
+        yoshimi.worker.batch_size = 500
+        yoshimi.worker.sleep = 0.1
+        yoshimi.worker.hooks = myapp.files.delete_files
+
+    Set ``yoshimi.trash.retention_days`` to have the worker move content
+    that has been in the trash for longer to pending deletion::
+
+        yoshimi.trash.retention_days = 30
+
+    :copyright: (c) 2013 by Ole Morten Halvorsen
+    :license: BSD, see LICENSE for more details.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import timedelta
+from pyramid.paster import (
+    get_appsettings,
+    setup_logging,
+)
+from pyramid.path import DottedNameResolver
+from yoshimi import db
+from yoshimi.worker import DeletionWorker
+
+
+def worker_from_settings(session, settings, batch_size=None, sleep=None):
+    """ Creates a :class:`~yoshimi.worker.DeletionWorker` configured from
+    `settings`
+
+    :param session: SQLAlchemy session
+    :param dict settings: Application settings
+    :param int batch_size: Overrides `yoshimi.worker.batch_size`
+    :param float sleep: Overrides `yoshimi.worker.sleep`
+    :rtype: :class:`~yoshimi.worker.DeletionWorker`
+    """
+    if batch_size is None:
+        batch_size = int(settings.get('yoshimi.worker.batch_size', 500))
+    if sleep is None:
+        sleep = float(settings.get('yoshimi.worker.sleep', 0))
+    resolver = DottedNameResolver()
+    hooks = [
+        resolver.resolve(name)
+        for name in settings.get('yoshimi.worker.hooks', '').split()
+    ]
+    retention = settings.get('yoshimi.trash.retention_days')
+    if retention:
+        retention = timedelta(days=float(retention))
+    else:
+        retention = None
+
+    return DeletionWorker(
+        session, batch_size, sleep, hooks, retention=retention
+    )
+
+
+def main(argv=sys.argv):
+    parser = argparse.ArgumentParser(
+        prog=os.path.basename(argv[0]),
+        description='Deletes content pending deletion in batches.',
+    )
+    parser.add_argument('config_uri', help='Configuration file to use')
+    parser.add_argument(
+        '--batch-size', type=int, help='Content to delete per batch'
+    )
+    parser.add_argument(
+        '--sleep', type=float, help='Seconds to sleep between batches'
+    )
+    parser.add_argument(
+        '--max-batches', type=int, help='Stop after this many batches'
+    )
+    parser.add_argument(
+        '--poll', type=float,
+        help='Keep running and check for new content every POLL seconds'
+    )
+    args = parser.parse_args(argv[1:])
+
+    setup_logging(args.config_uri)
+    settings = get_appsettings(args.config_uri)
+    db.setup_db(settings, extension=None)
+
+    session = db.Session()
+    worker = worker_from_settings(
+        session, settings, batch_size=args.batch_size, sleep=args.sleep
+    )
+
+    def progress(deleted, remaining):
+        print('Deleted %s content, %s left' % (deleted, remaining))
+
+    try:
+        while True:
+            worker.run(max_batches=args.max_batches, progress=progress)
+            if args.poll is None:
+                break
+            time.sleep(args.poll)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        session.close()
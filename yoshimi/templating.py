@@ -11,6 +11,7 @@ from pyramid.threadlocal import get_current_request
 from yoshimi.url import (
     url,
     path,
+    paths,
 )
 
 
@@ -65,6 +66,27 @@ def path_filter(context, *args, **kwargs):
     return path(request, context, *args, **kwargs)
 
 
+def paths_filter(contents, *args, **kwargs):
+    """Jinja2 filter for generating (relative) paths to many contexts at
+    once, see :func:`~yoshimi.url.paths`.
+
+    This method is not meant to be called directly, but used inside Jinja
+    templates.
+
+    .. sourcecode:: html+jinja
+
+        {% set child_paths = children|y_paths %}
+        {% for child in children %}
+            <a href="{{ child_paths[loop.index0] }}">{{ child.name }}</a>
+        {% endfor %}
+
+    :param contents: Content types to generate urls for
+    :type contents: list of :class:`~yoshimi.content.ContentType`
+    """
+    request = get_current_request()
+    return paths(request, contents, *args, **kwargs)
+
+
 def path_back_filter(context, *args, **kwargs):
     """Jinja2 filter for generating a relative url to context and include
     a `back` url parameter for redirecting back to the current page.
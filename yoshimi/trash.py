@@ -9,16 +9,36 @@
 """
 from datetime import datetime
 from zope.sqlalchemy import mark_changed
-from sqlalchemy import insert
+from sqlalchemy import (
+    and_,
+    insert,
+    select,
+)
 from sqlalchemy.sql.expression import literal
-from sqlalchemy.orm import contains_eager
-from yoshimi.entities import TrashContent
+from sqlalchemy.orm import (
+    aliased,
+    contains_eager,
+    with_expression,
+)
+from yoshimi.cache import get_region
+from yoshimi.entities import (
+    Counter,
+    TrashContent,
+)
 from yoshimi.content import (
     Content,
-    Path
+    Path,
+    expire_content,
+    invalidate_content,
+    invalidate_totals,
+    update_child_counts,
 )
 
 
+#: Name of the :class:`~yoshimi.entities.Counter` holding the trash count
+TRASH_COUNTER = 'trash'
+
+
 class Trash:
     """ Implements a soft delete for content.
 
@@ -67,30 +87,50 @@ class Trash:
         `target` if needed. Set `soft=True` if you want `target` to be deleted
         right away.
 
-        Note that this method will expire all objects in the current session.
+        Note that this method will expire the affected objects in the current
+        session.
 
         :param target: Content type to insert into the trash
         :type target: :class:`~yoshimi.content.ContentType`
         :param bool soft: Soft or hard insert
         """
+        self.insert_many([target], soft=soft)
+
+    def insert_many(self, targets, soft=True):
+        """ Inserts several content types and their children into the trash
+
+        Works like :meth:`insert` but handles all subtrees with the same
+        set of statements regardless of how many `targets` there are.
+
+        Note that this method will expire the affected objects in the current
+        session.
+
+        :param list targets: Content types to insert into the trash
+        :param bool soft: Soft or hard insert
+        """
+        ids = [target.id for target in targets]
+        if not ids:
+            return
+
         if soft:
-            status_id = Content.status.TRASHED
-            self._insert_trash_entities(target, status_id)
+            inserted = self._insert_trash_entities(ids)
             self._set_content_status(
-                target,
+                ids,
                 Content.status.AVAILABLE,
                 Content.status.TRASHED,
             )
+            adjust_trash_count(self._session, inserted)
         else:
-            status_id = Content.status.PENDING_DELETION
             self._set_content_status(
-                target,
+                ids,
                 Content.status.AVAILABLE,
                 Content.status.PENDING_DELETION,
             )
 
+        self._update_child_counts(ids)
+        invalidate_totals(self._session, *ids, descendants=True)
         mark_changed(self._session)
-        self._session.expire_all()
+        self._expire_trash_entries()
 
     def count(self):
         """ Returns the number of entries in the trash
@@ -98,32 +138,74 @@ class Trash:
         Only items marked as "trashed" will be counted. Anything pending
         deletion will not be counted.
 
+        The number is read from a counter maintained when content is
+        inserted, restored or emptied from the trash. Use :meth:`recount` (or
+        ``yoshimi-repair <config> trash-count``) to recompute it if it has
+        gotten out of sync.
+
         :return int: Number of items in the trash
         """
-        return self._session.query(TrashContent).join(
+        count = self._session.query(Counter.value).filter(
+            Counter.name == TRASH_COUNTER
+        ).scalar()
+        if count is None:
+            count = self.recount()
+
+        return count
+
+    def recount(self):
+        """ Recomputes the number of entries in the trash and stores it in
+        the counter read by :meth:`count`
+
+        :return int: Number of items in the trash
+        """
+        count = self._session.query(TrashContent).join(
             Content
         ).filter_by(
             status_id=Content.status.TRASHED
         ).count()
+        _set_counter(self._session, TRASH_COUNTER, count)
+
+        return count
 
     def items(self):
         """ Returns query that fetches items in the Trash
 
         The items returned by the query will be
         :class:`~yoshimi.entities.TrashContent`. To get the
-        :class:`~yoshimi.content.Content` use the `.content` property.
+        :class:`~yoshimi.content.Content` use the `.content` property. The id
+        and status of each item's parent are loaded in the same query as
+        `parent_id` and `parent_status_id`.
+
+        Items are ordered newest first by `(created_at, content_id)` which
+        makes the query suitable for keyset pagination with
+        :meth:`~yoshimi.db.BaseQuery.paginate_after`.
 
         :rtype: :class:`~sqlalchemy.orm.query.Query`
         """
+        parent_path = aliased(Path)
+        parent = Content.__table__.alias('parent')
+
         return self._session.query(TrashContent).join(
             Content
+        ).outerjoin(
+            parent_path, and_(
+                parent_path.descendant == Content.id,
+                parent_path.length == 1,
+            )
+        ).outerjoin(
+            parent, parent.c.id == parent_path.ancestor
         ).filter(
             Content.status_id == Content.status.TRASHED
         ).order_by(
-            TrashContent.created_at.desc()
+            TrashContent.created_at.desc(),
+            TrashContent.content_id.desc(),
         ).options(
-            contains_eager(TrashContent.content)
-            .joinedload(Content.paths, innerjoin=True),
+            contains_eager(TrashContent.content),
+            with_expression(TrashContent.parent_id, parent_path.ancestor),
+            with_expression(
+                TrashContent.parent_status_id, parent.c.status_id
+            ),
         )
 
     def empty(self):
@@ -132,7 +214,8 @@ class Trash:
         The contents of the trash won't be deleted from the database right away
         as that is a deferred process done via a background job.
 
-        Note that this method will expire all objects in the current session.
+        Note that this method will expire the affected objects in the current
+        session.
         """
         self._session.query(Content).filter_by(
             status_id=Content.status.TRASHED
@@ -141,14 +224,24 @@ class Trash:
             synchronize_session=False
         )
         self._session.query(TrashContent).delete(synchronize_session=False)
+        _set_counter(self._session, TRASH_COUNTER, 0)
 
+        totals = get_region('totals')
+        if totals is not None:
+            totals.clear()
         mark_changed(self._session)
-        self._session.expire_all()
+        self._expire_with_status(Content.status.TRASHED)
+        self._expire_trash_entries()
 
     def permanently_empty(self):
         """ Permanently removed items in the trash
 
         Physically deletes items that were marked "pending deletion".
+
+        Everything is deleted with one statement in the current transaction.
+        For large amounts of content use the ``yoshimi-worker`` background
+        job instead which deletes in batches, see
+        :class:`~yoshimi.worker.DeletionWorker`.
         """
         self._session.query(Content).filter_by(
             status_id=Content.status.PENDING_DELETION
@@ -157,7 +250,51 @@ class Trash:
         )
 
         mark_changed(self._session)
-        self._session.expire_all()
+        self._expire_with_status(Content.status.PENDING_DELETION)
+
+    def expire(self, before, limit=None):
+        """ Marks content trashed before `before` as pending deletion
+
+        The oldest entries are expired first using the index on
+        `trash.created_at`. Set `limit` to expire in bounded chunks, see
+        :meth:`yoshimi.worker.DeletionWorker.expire_trash`.
+
+        Note that this method will expire the affected objects in the current
+        session.
+
+        :param datetime before: Expire entries created before this time
+        :param int limit: Maximum number of entries to expire
+        :return int: Number of entries expired
+        """
+        table = TrashContent.__table__
+        query = select([table.c.content_id]).where(
+            table.c.created_at < before
+        ).order_by(table.c.created_at)
+        if limit is not None:
+            query = query.limit(limit)
+        ids = [id for id, in self._session.execute(query)]
+        if not ids:
+            return 0
+
+        self._session.query(Content).filter(
+            Content.id.in_(ids),
+            Content.status_id == Content.status.TRASHED,
+        ).update(
+            {Content.status_id: Content.status.PENDING_DELETION},
+            synchronize_session=False
+        )
+        deleted = self._session.query(TrashContent).filter(
+            TrashContent.content_id.in_(ids)
+        ).delete(synchronize_session=False)
+        adjust_trash_count(self._session, -deleted)
+
+        invalidate_content(self._session, *ids)
+        invalidate_totals(self._session, *ids)
+        mark_changed(self._session)
+        expire_content(self._session, *ids)
+        self._expire_trash_entries()
+
+        return len(ids)
 
     def restore(self, target, with_children=True):
         """ Restores `target` from the trash
@@ -166,76 +303,183 @@ class Trash:
         `with_children=False` if you want to only restore `target` and not its
         children.
 
-        Note that this method will expire all objects in the current session.
+        Note that this method will expire the affected objects in the current
+        session.
 
         :param target: Content type to restore from the trash
         :type target: :class:`~yoshimi.content.ContentType`
         :param bool with_children: Whether to include children
         """
         if with_children:
-            self._delete_trash_entries(target)
+            self.restore_many([target.id])
+        else:
+            self._session.delete(target.trash_info)
+            target.status_id = target.status.AVAILABLE
+            self._session.add(target)
+            self._session.flush()
+            adjust_trash_count(self._session, -1)
+            self._update_child_counts([target.id], with_children=False)
+
+    def restore_many(self, ids, with_children=True):
+        """ Restores the content with the given `ids` from the trash
+
+        Works like :meth:`restore` but the trash entries and statuses of
+        all subtrees are updated with one statement each, e.g to restore the
+        items selected in the admin.
+
+        Note that this method will expire the affected objects in the current
+        session.
+
+        :param list ids: Ids of the content to restore
+        :param bool with_children: Whether to include children
+        """
+        ids = list(ids)
+        if not ids:
+            return
+
+        if with_children:
+            deleted = self._delete_trash_entries(ids)
             self._set_content_status(
-                target,
+                ids,
                 Content.status.TRASHED,
                 Content.status.AVAILABLE,
             )
-            mark_changed(self._session)
-            self._session.expire_all()
         else:
-            self._session.delete(target.trash_info)
-            target.status_id = target.status.AVAILABLE
-            self._session.add(target)
+            deleted = self._session.query(TrashContent).filter(
+                TrashContent.content_id.in_(ids)
+            ).delete(synchronize_session=False)
+            self._session.query(Content).filter(
+                Content.id.in_(ids),
+                Content.status_id == Content.status.TRASHED,
+            ).update(
+                {Content.status_id: Content.status.AVAILABLE},
+                synchronize_session=False
+            )
 
-    def _set_content_status(self, target, old_status, new_status):
-        self._children_query(target).filter_by(
-            status_id=old_status
-        ).update(
-            {Content.status_id: new_status},
-            synchronize_session=False
+        adjust_trash_count(self._session, -deleted)
+        self._update_child_counts(ids, with_children)
+        invalidate_totals(self._session, *ids, descendants=with_children)
+        mark_changed(self._session)
+        self._expire_trash_entries()
+
+    def _update_child_counts(self, ids, with_children=True):
+        parent_ids = [id for id, in self._session.query(Path.ancestor).filter(
+            Path.descendant.in_(ids),
+            Path.length == 1,
+        )]
+        update_child_counts(self._session, list(set(ids) | set(parent_ids)))
+        invalidate_content(self._session, *parent_ids)
+        invalidate_content(self._session, *ids, descendants=with_children)
+
+        if with_children:
+            update_child_counts(
+                self._session,
+                self._session.query(Path.descendant).filter(
+                    Path.ancestor.in_(ids),
+                    Path.length > 0,
+                )
+            )
+
+        expire_content(self._session, *parent_ids)
+        expire_content(self._session, *ids, descendants=with_children)
+
+    def _expire_with_status(self, status_id):
+        """Expires loaded content that had `status_id` and their paths"""
+        ids = [
+            key[1][0] for key, obj in self._session.identity_map.items()
+            if isinstance(obj, Content) and
+            obj.__dict__.get('status_id') == status_id
+        ]
+        expire_content(self._session, *ids)
+
+    def _expire_trash_entries(self):
+        for obj in list(self._session.identity_map.values()):
+            if isinstance(obj, TrashContent):
+                self._session.expire(obj)
+
+    def _set_content_status(self, ids, old_status, new_status):
+        table = Content.__table__
+        self._session.execute(
+            table.update().where(and_(
+                self._in_subtrees(table.c.id, ids),
+                table.c.status_id == old_status,
+            )).values(status_id=new_status)
         )
 
-    def _insert_trash_entities(self, target, status_id):
+    def _insert_trash_entities(self, ids):
+        table = Content.__table__
         insert_columns = (
             TrashContent.content_id,
             TrashContent.created_at,
         )
-        select_columns = (
-            Content.id,
+        # A join would select content in overlapping subtrees twice
+        children_query = select([
+            table.c.id,
             literal(datetime.utcnow()).label("created_at"),
-        )
-        children_query = self._children_query(
-            target, select_columns
-        ).filter_by(
-            status_id=Content.status.AVAILABLE
-        )
+        ]).where(and_(
+            self._in_subtrees(table.c.id, ids, join=False),
+            table.c.status_id == Content.status.AVAILABLE,
+        ))
 
-        self._session.execute(
+        return self._session.execute(
             insert(TrashContent).from_select(
                 insert_columns, children_query
             )
-        )
+        ).rowcount
 
-    def _delete_trash_entries(self, target):
-        self._session.query(TrashContent).filter(
-            (TrashContent.content_id.in_(
-                self._session.query(Path.descendant).select_from(
-                    Path
-                ).filter(
-                    Path.ancestor == target.id
-                )
-            )) | (TrashContent.content_id == target.id)
-        ).delete(synchronize_session=False)
+    def _delete_trash_entries(self, ids):
+        table = TrashContent.__table__
+        return self._session.execute(
+            table.delete().where(
+                self._in_subtrees(table.c.content_id, ids)
+            )
+        ).rowcount
 
-    def _children_query(self, target, columns=None):
-        if not columns:
-            columns = (Content,)
+    def _in_subtrees(self, column, ids, join=True):
+        """Returns criteria matching `column` against the subtrees of `ids`
 
-        return self._session.query(*columns).filter(
-            (Content.id.in_(
-                self._session.query(Path.descendant).select_from(
-                    Path
-                ).filter(
-                    Path.ancestor == target.id
-                )
-            )) | (Content.id == target.id)
+        Every content has a path to itself so `ids` are included. On
+        PostgreSQL and MySQL `path` is joined, which renders as ``UPDATE ..
+        FROM`` / ``DELETE .. USING`` and multi-table statements respectively.
+        Elsewhere (e.g SQLite) an uncorrelated ``IN`` is used so the
+        descendants are looked up once via the index on `path.ancestor`.
+        """
+        if join and self._session.bind.dialect.name in ('postgresql', 'mysql'):
+            return and_(Path.descendant == column, Path.ancestor.in_(ids))
+
+        return column.in_(
+            select([Path.descendant]).where(Path.ancestor.in_(ids))
         )
+
+
+def adjust_trash_count(session, delta):
+    """ Adds `delta` to the trash counter, see :meth:`Trash.count`
+
+    The counter is recomputed if it doesn't exist yet.
+
+    :param session: SQLAlchemy session
+    :param int delta: Number of entries added (or removed if negative)
+    """
+    if not delta:
+        return
+
+    table = Counter.__table__
+    updated = session.execute(
+        table.update().where(
+            table.c.name == TRASH_COUNTER
+        ).values(value=table.c.value + delta)
+    ).rowcount
+    if not updated:
+        Trash(session).recount()
+
+
+def _set_counter(session, name, value):
+    table = Counter.__table__
+    updated = session.execute(
+        table.update().where(table.c.name == name).values(value=value)
+    ).rowcount
+    if not updated:
+        session.execute(table.insert().values(name=name, value=value))
+    # Mark the session as changed so the counter is committed, also when
+    # only read through Trash.count()
+    mark_changed(session)
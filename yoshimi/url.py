@@ -13,6 +13,8 @@ from pyramid.httpexceptions import HTTPMovedPermanently
 from pyramid.interfaces import IResourceURL
 from pyramid.traversal import ResourceURL
 from zope.interface import implementer
+from yoshimi.cache import get_region
+from yoshimi.content import load_lineages
 
 
 def path(request, content, *elements, route=None, **kw):
@@ -42,6 +44,37 @@ def path(request, content, *elements, route=None, **kw):
     )
 
 
+def paths(request, contents, *elements, route=None, **kw):
+    """ Generates relative URLs for many content objects in one go
+
+    Normally you would invoke this function via the request object as
+    ``y_paths``::
+
+        request.y_paths(children)
+
+    Works like :func:`path` but the lineages needed for content without a
+    :attr:`~yoshimi.content.Content.url_path` are loaded for the whole batch
+    with one query instead of one query per content.
+
+    :param request: A request object
+    :type request: :class:`~pyramid.request.Request`
+    :param contents: Iterable of :class:`~yoshimi.content.Content` to
+     generate URLs for
+    :param str route: Route to use when generating the URLs. If not provided
+     the :attr:`~pyramid.request.Request.matched_route.name` will be used.
+    :param dict kw: Dict of keywords which are passed onto
+     :meth:`~pyramid.request.Request.resource_path`
+    :return list: Relative URLs in the same order as `contents`
+    """
+    contents = list(contents)
+    load_lineages([c for c in contents if c.url_path is None])
+
+    return [
+        path(request, content, *elements, route=route, **kw)
+        for content in contents
+    ]
+
+
 def url(request, content, *elements, route=None, **kw):
     """ Generates a absolute URL for a given content and route name
 
@@ -171,9 +204,19 @@ class ResourceUrlAdapter(ResourceURL):
     not meant to be used directly.
 
     This is a thin wrapper around the default
-    :class:`pyramid.traversal.ResourceURL` class in Pyramid. This class ensures
-    that the :class:`~yoshimi.content.Content` is made *Location Aware* (i.e
-    it has __name__ and __parent__ attributes).
+    :class:`pyramid.traversal.ResourceURL` class in Pyramid. If the content
+    has a :attr:`~yoshimi.content.Content.url_path` the path is generated from
+    it without loading the lineage. Otherwise this class ensures that the
+    :class:`~yoshimi.content.Content` is made *Location Aware* (i.e it has
+    __name__ and __parent__ attributes).
+
+    If the `urls` cache region is enabled (see :mod:`yoshimi.cache`) the paths
+    generated from url paths are cached by content id, virtual root and url
+    path. They are invalidated for a whole subtree when the url paths change,
+    i.e when an ancestor's slug changes or content is moved. As the url path
+    is part of the key a process that missed the invalidation doesn't hand
+    out the old path for content loaded after the change, e.g when
+    :class:`RootFactory` checks the requested URL.
     """
     def __init__(self, content, request):
         """
@@ -182,8 +225,51 @@ class ResourceUrlAdapter(ResourceURL):
         :param request: Current request
         :type request: :class:`~pyramid.request.Request`
         """
-        self._make_location_aware(self._slug_tuple(content), content.lineage)
-        super().__init__(content, request)
+        cache = None
+        if content.id is not None and content.url_path is not None:
+            cache = get_region('urls')
+        key = (request.environ.get(self.VH_ROOT_KEY), content.url_path)
+        if cache is not None:
+            paths = cache.get(content.id) or {}
+            if key in paths:
+                (self.virtual_path, self.physical_path,
+                 self.virtual_path_tuple, self.physical_path_tuple) = \
+                    paths[key]
+                return
+
+        if content.url_path is not None:
+            resource = self._location_from_url_path(content)
+        else:
+            self._make_location_aware(
+                self._slug_tuple(content), content.lineage
+            )
+            resource = content
+        super().__init__(resource, request)
+
+        if cache is not None:
+            paths = dict(paths)
+            paths[key] = (
+                self.virtual_path, self.physical_path,
+                self.virtual_path_tuple, self.physical_path_tuple,
+            )
+            cache.set(content.id, paths)
+
+    def _location_from_url_path(self, content):
+        """Generates a chain of lightweight location aware objects from the
+        content's url path.
+
+        :param content: Content with a url path
+        :type content: :class:`~yoshimi.content.Content`
+        :return: The location representing `content`
+        """
+        path_elements = content.url_path.split('/')
+        path_elements[-1] += "-%s" % content.id
+
+        location = None
+        for path in path_elements:
+            location = _Location(path, location)
+
+        return location
 
     def _make_location_aware(self, path_elements, content_list):
         """Generates ``__parent__`` and ``__name__`` attributes for a list
@@ -207,6 +293,13 @@ class ResourceUrlAdapter(ResourceURL):
         return slugs
 
 
+class _Location:
+    """Stand-in for a :class:`~yoshimi.content.Content` in a lineage"""
+    def __init__(self, name, parent):
+        self.__name__ = name
+        self.__parent__ = parent
+
+
 class RootFactory:
     """ Generates a traversal root factory for Pyramid to use when looking up
     URLs.
@@ -38,22 +38,34 @@ class LazyPagination:
     you don't want it to trigger any queries until variable is actually
     accessed.
 
+    If `page` is given the query's `paginate` method is used, otherwise keyset
+    pagination is done with `paginate_after` starting after `cursor`.
+
     Example::
 
         list = LazyPagination(article.children(), 3)
         list.total #=> Triggers the query
         3
 
+        list = LazyPagination(article.children(), cursor=cursor)
+        list.next_cursor #=> Triggers the query
+
     :param string query: A query
+    :param int page: Page number
+    :param str cursor: Cursor to fetch the page after
     """
-    def __init__(self, query, page):
+    def __init__(self, query, page=None, cursor=None):
         self.query = query
         self.page = page
+        self.cursor = cursor
         self.paginator = None
 
     def __getattr__(self, name):
         if not self.paginator:
-            self.paginator = self.query.paginate(self.page)
+            if self.page is not None:
+                self.paginator = self.query.paginate(self.page)
+            else:
+                self.paginator = self.query.paginate_after(self.cursor)
 
         return getattr(self.paginator, name)
 
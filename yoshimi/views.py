@@ -9,28 +9,30 @@
 """
 from functools import wraps
 import venusian
+from sqlalchemy.orm import aliased
 from yoshimi.browse import BrowsePolicy
-from yoshimi.content import Content
+from yoshimi.content import (
+    Content,
+    Path,
+)
 from yoshimi.forms import (
     LoginForm,
     ContentEditForm,
     ContentMoveForm,
 )
+from yoshimi.repo import status_is
 from yoshimi.url import (
     redirect_back,
     redirect_back_to_context,
     redirect_back_to_parent,
 )
-from yoshimi.utils import (
-    page_number,
-    LazyPagination
-)
+from yoshimi.utils import LazyPagination
 
 
 def index(context, request):
     children = LazyPagination(
         request.y_repo.query(context).children().load_path(),
-        page_number(request.GET.get('page', 1))
+        cursor=request.GET.get('cursor')
     )
 
     return {
@@ -92,11 +94,12 @@ def browse(request):
         request.y_repo.query(Content).get(int(request.GET['originator_id']))
     )
 
-    children = request.context.children().paginate(
-        page_number(request.GET.get('page', 1)),
-        per_page=10,
-        error_out=False
-    )
+    children = request.y_repo.query(request.context).children() \
+        .load_path().paginate_after(
+            request.GET.get('cursor'),
+            per_page=10,
+            error_out=False
+        )
 
     return {
         'children': children,
@@ -105,6 +108,74 @@ def browse(request):
     }
 
 
+#: Maximum number of levels :func:`tree` will prefetch in one request
+TREE_MAX_DEPTH = 3
+
+
+def tree(context, request):
+    """Returns the children of `context` as JSON for the admin tree widget
+
+    Nodes are returned in the format expected by jqTree. The GET parameter
+    `depth` (default 1, max :data:`TREE_MAX_DEPTH`) controls how many levels
+    are prefetched. Nodes with children below the prefetched levels are
+    flagged with `load_on_demand` so the widget can fetch them when expanded.
+
+    All levels are fetched with a single query on the closure table and the
+    URLs are generated for all nodes in one go with
+    :func:`yoshimi.url.paths`.
+
+    :param context: Content to list the children of
+    :param request: Pyramid.request.Request
+    :return: List of nodes
+    """
+    try:
+        depth = int(request.GET.get('depth', 1))
+    except ValueError:
+        depth = 1
+    depth = max(1, min(depth, TREE_MAX_DEPTH))
+
+    subtree = aliased(Path)
+    parent = aliased(Path)
+    rows = request.y_db.query(Content, parent.ancestor).join(
+        subtree, subtree.descendant == Content.id
+    ).join(
+        parent, parent.descendant == Content.id
+    ).filter(
+        subtree.ancestor == context.id,
+        subtree.length.between(1, depth),
+        parent.length == 1,
+        status_is(Content.status.AVAILABLE),
+    ).order_by(subtree.length, Content.id)
+
+    nodes = {context.id: {'children': []}}
+    contents = []
+    for content, parent_id in rows:
+        if parent_id not in nodes:
+            # Available content below a parent that isn't, e.g content
+            # restored without its trashed parent
+            continue
+        node = {
+            'id': content.id,
+            'label': content.name,
+            'type': content.type,
+            'has_children': content.has_children,
+            'children': [],
+        }
+        nodes[parent_id]['children'].append(node)
+        nodes[content.id] = node
+        contents.append(content)
+
+    for content, url in zip(contents, request.y_paths(contents)):
+        nodes[content.id]['url'] = url
+
+    for node in nodes.values():
+        node['load_on_demand'] = (
+            node.get('has_children', False) and not node['children']
+        )
+
+    return nodes[context.id]['children']
+
+
 def login(request):
     """Logs a user in and sets the csrf token in the session
 
@@ -0,0 +1,209 @@
+"""
+    yoshimi.worker
+    ~~~~~~~~~~~~~~
+
+    Implements the background job that physically deletes content marked as
+    pending deletion by the :class:`~yoshimi.trash.Trash`.
+
+    Normally the worker is run with the ``yoshimi-worker`` command, see
+    :mod:`yoshimi.scripts.worker`.
+
+    :copyright: (c) 2013 by Ole Morten Halvorsen
+    :license: BSD, see LICENSE for more details.
+"""
+import logging
+import time
+from datetime import datetime
+from sqlalchemy import (
+    and_,
+    exists,
+    select,
+)
+from yoshimi.content import (
+    Content,
+    Path,
+)
+from yoshimi.trash import Trash
+
+log = logging.getLogger(__name__)
+
+
+class DeletionWorker:
+    """ Deletes content pending deletion in bounded batches
+
+    Each batch is deleted and committed in its own transaction so locks are
+    held briefly and the cascade through the `path` table stays small. Only
+    content without children is deleted, so subtrees are deleted bottom-up
+    and content pending deletion that still has children which are not
+    (e.g children in the trash) is skipped. No state is kept between
+    batches, so if the worker is stopped or crashes it simply continues with
+    the remaining content when it's started again.
+
+    Hooks are called with the session and the ids of the content in a batch
+    before it's deleted, e.g to remove files stored on external systems::
+
+        def delete_files(session, ids):
+            for image in session.query(Image).filter(Image.id.in_(ids)):
+                cdn.delete(image.path)
+
+        DeletionWorker(session, hooks=[delete_files]).run()
+
+    If a hook raises an exception the batch is rolled back and will be
+    retried on the next run.
+
+    When `retention` is set, content that has been in the trash for longer
+    is marked as pending deletion before each run, see
+    :meth:`expire_trash`.
+
+    :param session: SQLAlchemy session
+    :type session: :class:`~sqlalchemy.orm.session.Session`
+    :param int batch_size: Maximum number of content to delete per batch
+    :param float sleep: Seconds to sleep between batches to give other
+     transactions room
+    :param list hooks: Callables called with `(session, ids)` for each batch
+    :param callable sleeper: Function used to sleep
+    :param retention: How long content is kept in the trash. None means
+     forever.
+    :type retention: :class:`~datetime.timedelta`
+    """
+    def __init__(self, session, batch_size=500, sleep=0, hooks=(),
+                 sleeper=time.sleep, retention=None):
+        self._session = session
+        self.batch_size = batch_size
+        self.sleep = sleep
+        self.hooks = list(hooks)
+        self._sleeper = sleeper
+        self.retention = retention
+
+    def pending(self):
+        """ Returns the number of content left to delete
+
+        :return int:
+        """
+        return self._session.query(Content).filter(
+            Content.status_id == Content.status.PENDING_DELETION
+        ).count()
+
+    def run_batch(self):
+        """ Deletes and commits one batch
+
+        :return list: Ids of the deleted content
+        """
+        ids = self._next_batch()
+        if not ids:
+            return ids
+
+        try:
+            for hook in self.hooks:
+                hook(self._session, ids)
+            self._session.execute(
+                Content.__table__.delete().where(
+                    Content.__table__.c.id.in_(ids)
+                )
+            )
+            self._session.commit()
+        except Exception:
+            self._session.rollback()
+            raise
+
+        return ids
+
+    def expire_trash(self, now=None):
+        """ Marks content kept in the trash for longer than `retention` as
+        pending deletion
+
+        Entries are expired in chunks of `batch_size`, each in its own
+        transaction, oldest first.
+
+        :param datetime now: Current time, defaults to :meth:`datetime.utcnow`
+        :return int: Number of trash entries expired
+        """
+        if self.retention is None:
+            return 0
+
+        before = (now or datetime.utcnow()) - self.retention
+        trash = Trash(self._session)
+        expired = 0
+        while True:
+            try:
+                count = trash.expire(before, limit=self.batch_size)
+                self._session.commit()
+            except Exception:
+                self._session.rollback()
+                raise
+            expired += count
+            if count < self.batch_size:
+                break
+            if self.sleep:
+                self._sleeper(self.sleep)
+
+        if expired:
+            log.info('Expired %s trash entries', expired)
+        return expired
+
+    def run(self, max_batches=None, progress=None):
+        """ Deletes batches until no content is pending deletion
+
+        Expired trash entries are marked as pending deletion first.
+
+        :param int max_batches: Stop after this many batches. None means
+         keep going until done.
+        :param callable progress: Called with the number of content deleted
+         so far and the number left after each batch
+        :return int: Number of content deleted
+        """
+        self.expire_trash()
+        deleted = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            if batches and self.sleep:
+                self._sleeper(self.sleep)
+
+            ids = self.run_batch()
+            if not ids:
+                break
+
+            batches += 1
+            deleted += len(ids)
+            remaining = self.pending()
+            log.info('Deleted %s content, %s left', deleted, remaining)
+            if progress is not None:
+                progress(deleted, remaining)
+            if not remaining:
+                break
+
+        return deleted
+
+    def _next_batch(self):
+        """Returns the ids of the next batch of content without children
+
+        Content is deleted bottom-up so the `path` cascade never leaves
+        paths from surviving descendants to deleted content. Pending content
+        with children that are not pending deletion (e.g children that are
+        in the trash) is never selected and is left for a later run.
+        """
+        table = Content.__table__
+        pending = table.c.status_id == Content.status.PENDING_DELETION
+        has_children = exists().where(and_(
+            Path.ancestor == table.c.id,
+            Path.length > 0,
+        ))
+
+        ids = self._select_ids(and_(pending, ~has_children))
+        if not ids:
+            blocked = self.pending()
+            if blocked:
+                log.warning(
+                    'Skipping %s content pending deletion with children '
+                    'that are not pending deletion', blocked
+                )
+
+        return ids
+
+    def _select_ids(self, criteria):
+        table = Content.__table__
+        query = select([table.c.id]).where(criteria).order_by(
+            table.c.id
+        ).limit(self.batch_size)
+
+        return [id for id, in self._session.execute(query)]